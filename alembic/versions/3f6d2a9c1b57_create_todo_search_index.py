@@ -0,0 +1,29 @@
+"""Create todo search index
+
+Revision ID: 3f6d2a9c1b57
+Revises: eb1f37eeab41
+Create Date: 2026-10-18 14:26:41.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6d2a9c1b57'
+down_revision: Union[str, None] = 'eb1f37eeab41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite: tabela FTS5 + triggers (e indexa os todos existentes); PostgreSQL: índice GIN.
+    create_search_index(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_search_index(op.get_bind())
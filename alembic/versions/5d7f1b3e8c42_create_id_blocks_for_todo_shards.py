@@ -0,0 +1,42 @@
+"""Create id blocks table for todo shards
+
+Revision ID: 5d7f1b3e8c42
+Revises: a8e4c0d2f613
+Create Date: 2026-10-18 18:41:27.310962
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7f1b3e8c42'
+down_revision: Union[str, None] = 'a8e4c0d2f613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# `alembic -x shard=true upgrade head` em um banco que é só shard de todos (ver sharding.py):
+# os usuários ficam no banco principal, então a chave estrangeira todos.owner_id -> users.id
+# não pode ser verificada no shard. (O SQLite não verifica chaves estrangeiras por padrão.)
+def is_shard() -> bool:
+    return context.get_x_argument(as_dictionary=True).get('shard', '').lower() in ('1', 'true', 'yes')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'id_blocks',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('next_value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    if is_shard() and op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('todos_owner_id_fkey', 'todos', type_='foreignkey')
+
+
+def downgrade() -> None:
+    if is_shard() and op.get_bind().dialect.name == 'postgresql':
+        op.create_foreign_key('todos_owner_id_fkey', 'todos', 'users', ['owner_id'], ['id'])
+    op.drop_table('id_blocks')
@@ -1,7 +1,7 @@
 """Create phone number for user column
 
 Revision ID: 7c91c7810deb
-Revises: 
+Revises: 0b3c5e7a9d21
 Create Date: 2025-01-29 14:11:40.490418
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = '7c91c7810deb'
-down_revision: Union[str, None] = None
+down_revision: Union[str, None] = '0b3c5e7a9d21'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
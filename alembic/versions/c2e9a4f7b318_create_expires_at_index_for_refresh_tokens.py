@@ -0,0 +1,26 @@
+"""Create expires_at index for refresh tokens
+
+Revision ID: c2e9a4f7b318
+Revises: 5d7f1b3e8c42
+Create Date: 2026-10-19 10:12:44.918305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e9a4f7b318'
+down_revision: Union[str, None] = '5d7f1b3e8c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Os refresh tokens expirados são apagados a cada login/refresh (ver routers/auth.py).
+def upgrade() -> None:
+    op.create_index('ix_refresh_tokens_expires_at', 'refresh_tokens', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_refresh_tokens_expires_at', table_name='refresh_tokens')
@@ -0,0 +1,28 @@
+"""Create owner indexes for todos
+
+Revision ID: eb1f37eeab41
+Revises: 7c91c7810deb
+Create Date: 2026-10-18 09:12:03.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'eb1f37eeab41'
+down_revision: Union[str, None] = '7c91c7810deb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_todos_owner_id_id', 'todos', ['owner_id', 'id'])
+    op.create_index('ix_todos_owner_id_complete_priority', 'todos', ['owner_id', 'complete', 'priority'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_owner_id_complete_priority', table_name='todos')
+    op.drop_index('ix_todos_owner_id_id', table_name='todos')
@@ -0,0 +1,103 @@
+"""
+    Benchmark for the composite indexes on the todos table.
+
+    Seeds a throwaway SQLite database with N todos (spread over N / TODOS_PER_USER owners),
+    measures the queries issued by routers/todos.py without the owner indexes, creates the
+    indexes and measures again. The result is printed as JSON.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_indexes --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, insert
+from sqlalchemy.pool import StaticPool
+
+from models import Base, Todos as TodosModel
+
+
+TODOS_PER_USER = 100
+INDEXES = [index for index in TodosModel.__table__.indexes if index.name.startswith('ix_todos_owner_id')]
+
+QUERIES = {
+    # read_all: primeira página da listagem de um usuário
+    'list': lambda owner_id, todo_id: select(TodosModel).where(TodosModel.owner_id == owner_id)
+        .order_by(TodosModel.id).limit(50),
+    # read_all com filtros complete= e priority=
+    'list_filtered': lambda owner_id, todo_id: select(TodosModel).where(TodosModel.owner_id == owner_id)
+        .where(TodosModel.complete == False).where(TodosModel.priority == 3)
+        .order_by(TodosModel.id).limit(50),
+    # read_todo / update_todo / delete_todo
+    'lookup': lambda owner_id, todo_id: select(TodosModel).where(TodosModel.id == todo_id)
+        .where(TodosModel.owner_id == owner_id),
+}
+
+
+def seed(engine, size: int):
+    rows = [{'title': f'Todo {i}', 'description': 'Benchmark todo', 'priority': i % 5 + 1,
+             'complete': i % 3 == 0, 'owner_id': i % max(1, size // TODOS_PER_USER) + 1}
+            for i in range(size)]
+    with engine.begin() as connection:
+        for start in range(0, size, 50_000):
+            connection.execute(insert(TodosModel), rows[start:start + 50_000])
+
+
+def measure(engine, size: int, iterations: int) -> dict:
+    owners = max(1, size // TODOS_PER_USER)
+    rng = random.Random(42)
+    samples = [(rng.randint(1, owners), rng.randint(1, size)) for _ in range(iterations)]
+
+    results = {}
+    with engine.connect() as connection:
+        for name, build in QUERIES.items():
+            timings = []
+            for owner_id, todo_id in samples:
+                start = time.perf_counter()
+                connection.execute(build(owner_id, todo_id)).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = {
+                'p50_ms': round(statistics.median(timings), 4),
+                'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 4),
+            }
+    return results
+
+
+def run(size: int, iterations: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        for index in INDEXES:
+            index.drop(bind=engine)
+
+        seed(engine, size)
+        before = measure(engine, size, iterations)
+
+        for index in INDEXES:
+            index.create(bind=engine)
+        with engine.connect() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        after = measure(engine, size, iterations)
+        engine.dispose()
+
+    return {'rows': size, 'before': before, 'after': after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated row counts')
+    parser.add_argument('--iterations', type=int, default=200, help='queries per measurement')
+    args = parser.parse_args()
+
+    results = [run(int(size), args.iterations) for size in args.sizes.split(',')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+    Throughput and latency benchmark for every route in routers/.
+
+    Seeds a throwaway SQLite database with USERS x TODOS_PER_USER todos, then drives each
+    endpoint concurrently with an async httpx client against the in-process ASGI app (no
+    network, no uvicorn) using real JWTs. Prints req/s and p50/p95/p99 latency per route
+    as JSON, so runs can be diffed before a deploy.
+    GET /todos/events is left out: it is a long-lived stream, not a request/response route.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_routes --users 100 --todos-per-user 100 --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def refresh_token_for(n: int) -> str:
+    return f'bench-refresh-{n}'
+
+
+def seed(engine, users: int, todos_per_user: int, extra_todos: int, extra_users: int, refresh_tokens: int):
+    """Insere os dados da mesma forma que as fixtures de test/utils.py, mas em lote."""
+    from sqlalchemy import insert
+    from hashing import bcrypt_context
+    from models import Base, Users as UsersModel, Todos as TodosModel, RefreshTokens as RefreshTokensModel
+    from routers.auth import hash_refresh_token
+
+    Base.metadata.create_all(bind=engine)
+    hashed_password = bcrypt_context.hash('benchpassword')  # um único hash para todos os usuários
+    with engine.begin() as connection:
+        connection.execute(insert(UsersModel), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'first_name': 'Bench', 'last_name': f'User {i}',
+             'hashed_password': hashed_password, 'is_active': True, 'role': 'admin' if i == 1 else 'user',
+             'phone_number': '(99) 99999-9999'}
+            for i in range(1, users + extra_users + 1)])
+        rows = [{'title': f'Todo {n}', 'description': 'Benchmark todo', 'priority': n % 5 + 1,
+                 'complete': n % 3 == 0, 'owner_id': owner_id}
+                for owner_id in range(1, users + 1) for n in range(todos_per_user)]
+        # todos extras do usuário 1, consumidos pelas rotas de DELETE
+        rows += [{'title': f'Disposable {n}', 'description': 'Benchmark todo', 'priority': 1,
+                  'complete': False, 'owner_id': 1} for n in range(extra_todos)]
+        for start in range(0, len(rows), 50_000):
+            connection.execute(insert(TodosModel), rows[start:start + 50_000])
+        # refresh tokens consumidos por /auth/refresh e /auth/logout (o n-ésimo é do usuário n % users + 1)
+        expires_at = int(time.time()) + 24 * 3600
+        connection.execute(insert(RefreshTokensModel), [
+            {'token_hash': hash_refresh_token(refresh_token_for(n)), 'user_id': n % users + 1, 'expires_at': expires_at}
+            for n in range(refresh_tokens)])
+
+
+def build_scenarios(users: int, todos_per_user: int, requests: int, slow_requests: int):
+    """Retorna (nome, método, quantidade, função i -> (path, kwargs do httpx, usuário))."""
+    todo_body = {'title': 'Bench Todo', 'description': 'Benchmark todo', 'priority': 3, 'complete': False}
+    first_extra_todo = users * todos_per_user + 1
+    deletable_todos = itertools.count(first_extra_todo)
+    deletable_users = itertools.count(users + 1)
+    refresh_tokens = itertools.count()
+
+    def owner(i):
+        return i % users + 1
+
+    def own_todo(i):
+        user_id = owner(i)
+        return (user_id - 1) * todos_per_user + i % todos_per_user + 1, user_id
+
+    def get_todo(i):
+        todo_id, user_id = own_todo(i)
+        return f'/todo/{todo_id}', {}, user_id
+
+    def put_todo(i):
+        todo_id, user_id = own_todo(i)
+        return f'/todo/{todo_id}', {'json': todo_body}, user_id
+
+    def put_bulk(i):
+        todo_id, user_id = own_todo(i)
+        return '/todos/bulk', {'json': [{**todo_body, 'id': todo_id}]}, user_id
+
+    def refresh(i):
+        return '/auth/refresh', {'json': {'refresh_token': refresh_token_for(next(refresh_tokens))}}, None
+
+    def logout(i):
+        # o logout revoga o access token usado: cada requisição usa um token novo, e não o
+        # compartilhado pelas outras rotas
+        from routers.auth import create_access_token
+        n = next(refresh_tokens)
+        token = create_access_token(f'user{owner(n)}', owner(n), 'user', timedelta(hours=1))
+        return '/auth/logout', {'json': {'refresh_token': refresh_token_for(n)},
+                                'headers': {'Authorization': f'Bearer {token}'}}, None
+
+    def create_user(i):
+        return '/auth/', {'json': {'username': f'new{i}', 'email': f'new{i}@example.com', 'first_name': 'New',
+                                   'last_name': 'User', 'password': 'benchpassword', 'role': 'user',
+                                   'phone_number': '(99) 99999-9999'}}, None
+
+    return [
+        ('GET /healthy', 'GET', requests, lambda i: ('/healthy', {}, None)),
+        ('GET /', 'GET', requests, lambda i: ('/', {}, owner(i))),
+        ('GET /todo/{todo_id}', 'GET', requests, get_todo),
+        ('POST /todo', 'POST', requests, lambda i: ('/todo', {'json': todo_body}, owner(i))),
+        ('PUT /todo/{todo_id}', 'PUT', requests, put_todo),
+        ('POST /todos/bulk', 'POST', requests, lambda i: ('/todos/bulk', {'json': [todo_body] * 10}, owner(i))),
+        ('PUT /todos/bulk', 'PUT', requests, put_bulk),
+        ('GET /todos/search', 'GET', requests,
+         lambda i: ('/todos/search', {'params': {'q': f'todo {i % 10}'}}, owner(i))),
+        ('GET /todos/stats', 'GET', requests, lambda i: ('/todos/stats', {}, owner(i))),
+        ('DELETE /todo/{todo_id}', 'DELETE', requests, lambda i: (f'/todo/{next(deletable_todos)}', {}, 1)),
+        ('DELETE /todos/bulk', 'DELETE', requests,
+         lambda i: ('/todos/bulk', {'json': {'ids': [next(deletable_todos)]}}, 1)),
+        ('GET /admin/todo', 'GET', slow_requests, lambda i: ('/admin/todo', {}, 1)),
+        ('GET /admin/users', 'GET', slow_requests, lambda i: ('/admin/users', {}, 1)),
+        ('GET /admin/stats', 'GET', slow_requests, lambda i: ('/admin/stats', {}, 1)),
+        ('GET /admin/slow-queries', 'GET', requests, lambda i: ('/admin/slow-queries', {}, 1)),
+        ('DELETE /admin/todo/{todo_id}', 'DELETE', requests,
+         lambda i: (f'/admin/todo/{next(deletable_todos)}', {}, 1)),
+        ('DELETE /admin/user/{user_id}', 'DELETE', requests,
+         lambda i: (f'/admin/user/{next(deletable_users)}', {}, 1)),
+        ('GET /user/', 'GET', requests, lambda i: ('/user/', {}, owner(i))),
+        ('PUT /user/phonenumber/{phone_number}', 'PUT', requests,
+         lambda i: (f'/user/phonenumber/(99) {i:05d}-0000', {}, owner(i))),
+        # rotas com bcrypt: bem mais caras, então usam menos requisições
+        ('PUT /user/password', 'PUT', slow_requests,
+         lambda i: ('/user/password', {'json': {'password': 'benchpassword', 'new_password': 'benchpassword'}}, owner(i))),
+        ('POST /auth/token', 'POST', slow_requests,
+         lambda i: ('/auth/token', {'data': {'username': f'user{owner(i)}', 'password': 'benchpassword'}}, None)),
+        ('POST /auth/', 'POST', slow_requests, create_user),
+        ('POST /auth/refresh', 'POST', requests, refresh),
+        ('POST /auth/logout', 'POST', requests, logout),
+    ]
+
+
+async def run_scenario(client, tokens: dict, method: str, count: int, build, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        path, kwargs, user_id = build(i)
+        headers = {'Authorization': f'Bearer {tokens[user_id]}'} if user_id else {}
+        headers.update(kwargs.pop('headers', {}))
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': count,
+        'errors': errors,
+        'req_per_s': round(count / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from database import get_engine
+    from main import app
+    from routers.auth import create_access_token
+
+    total_requests = args.requests * 3 + args.slow_requests  # DELETE /todo, /todos/bulk e /admin/todo
+    seed(get_engine(), args.users, args.todos_per_user, extra_todos=total_requests, extra_users=args.requests,
+         refresh_tokens=args.requests * 2)  # POST /auth/refresh e /auth/logout
+
+    tokens = {user_id: create_access_token(f'user{user_id}', user_id, 'admin' if user_id == 1 else 'user',
+                                           timedelta(hours=1))
+              for user_id in range(1, args.users + 1)}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    # O ASGITransport não executa o lifespan; sem ele as métricas de SQL não são registradas.
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for name, method, count, build in build_scenarios(args.users, args.todos_per_user,
+                                                          args.requests, args.slow_requests):
+            if args.only and args.only not in name:
+                continue
+            results[name] = await run_scenario(client, tokens, method, count, build, args.concurrency)
+            print(f'{name}: {results[name]}', file=sys.stderr)
+    return {'users': args.users, 'todos_per_user': args.todos_per_user,
+            'concurrency': args.concurrency, 'routes': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--todos-per-user', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=500, help='requests per route')
+    parser.add_argument('--slow-requests', type=int, default=50, help='requests for bcrypt and full-table routes')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--only', help='run only routes whose name contains this text')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # O banco do benchmark precisa ser configurado antes de importar database/main.
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+        os.environ.setdefault('ALGORITHM', 'HS256')
+        # todas as requisições vêm do mesmo "IP": sem isso o limite de login recusaria a maioria
+        os.environ.setdefault('LOGIN_RATE_LIMIT_BACKEND', 'none')
+        report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
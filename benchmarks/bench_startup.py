@@ -0,0 +1,103 @@
+"""
+    Cold-start benchmark: how long a fresh worker takes before it can serve requests.
+
+    Each run spawns a new Python process (nothing cached in memory, like a new worker or
+    pod) against an already migrated SQLite database and measures:
+        import_ms         `import main`
+        startup_ms        the app lifespan startup
+        first_request_ms  first GET /healthy
+        first_db_ms       first authenticated request that touches the database
+    Prints the median and min of each phase over all runs as JSON.
+
+    Usage (from the project root):
+        python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+# Executado em um processo novo a cada rodada.
+CHILD = r'''
+import asyncio, json, time
+from datetime import timedelta
+import httpx  # usado só pelo benchmark: fora das medições
+
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run():
+    from routers.auth import create_access_token
+
+    app = main.app
+    timings = {'import_ms': (imported - start) * 1000}
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        timings['startup_ms'] = (started - imported) * 1000
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            response = await client.get('/healthy')
+            assert response.status_code == 200, response.text
+            first = time.perf_counter()
+            timings['first_request_ms'] = (first - started) * 1000
+
+            token = create_access_token('bench', 1, 'user', timedelta(minutes=5))
+            response = await client.get('/todos/stats', headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 200, response.text
+            timings['first_db_ms'] = (time.perf_counter() - first) * 1000
+    print(json.dumps(timings))
+
+asyncio.run(run())
+'''
+
+
+def migrate(database_url: str):
+    """Cria o schema uma única vez, como o `alembic upgrade head` de um deploy."""
+    from sqlalchemy import create_engine
+    from models import Base
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='database to start against (default: a temporary SQLite file)')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, 'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}"}
+        env.setdefault('SECRET_KEY', 'benchmark-secret')
+        env.setdefault('ALGORITHM', 'HS256')
+        os.environ.update(env)
+        migrate(env['DATABASE_URL'])
+
+        runs = []
+        for run in range(args.runs):
+            result = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            print(f'run {run + 1}: {runs[-1]}', file=sys.stderr)
+
+    report = {'runs': args.runs, 'phases': {
+        phase: {'median_ms': round(statistics.median(run[phase] for run in runs), 2),
+                'min_ms': round(min(run[phase] for run in runs), 2)}
+        for phase in runs[0]
+    }}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
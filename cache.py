@@ -0,0 +1,241 @@
+# Caches: LRU em memória (por processo) e cache de leitura versionado por dono, com
+# backend em memória ou Redis. Todos com limite de tamanho, expiração e contadores.
+# A versão por dono também gera os ETags das respostas (GET condicional).
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+class LRUCache:
+    """Cache LRU com TTL por item.
+
+    Quando o limite de itens é atingido, o item usado há mais tempo é descartado.
+    Itens expirados são removidos quando lidos.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None, expires_at: float | None = None):
+        """Guarda o valor até `expires_at` (epoch), por `ttl` segundos ou pelo TTL padrão."""
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations}
+
+
+# Backends do cache de leitura ----------------------------------------------------
+# Interface assíncrona comum para que o backend em memória e um Redis (ou um fake
+# compatível, nos testes) sejam intercambiáveis.
+class MemoryBackend:
+    """Backend local (por processo) sobre um LRUCache."""
+
+    def __init__(self, maxsize: int = 10_000):
+        self.lru = LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str):
+        return self.lru.get(key)
+
+    async def set(self, key: str, value, ttl: float | None = None):
+        self.lru.set(key, value, ttl=ttl)
+
+    async def bump(self, key: str, ttl: float | None = None) -> int:
+        # Começa em time_ns e só cresce: se a versão for descartada pelo LRU (ou
+        # expirar), a nova versão nunca coincide com uma antiga.
+        version = max((self.lru.get(key) or 0) + 1, time.time_ns())
+        self.lru.set(key, version, ttl=ttl)
+        return version
+
+    def clear(self):
+        self.lru.clear()
+
+
+class RedisBackend:
+    """Backend compartilhado entre workers, para um cliente compatível com redis.asyncio."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value, ttl: float | None = None):
+        await self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    async def bump(self, key: str, ttl: float | None = None) -> int:
+        # Mesma ideia do MemoryBackend: a contagem começa em time_ns (SET NX) e não em 1.
+        await self.client.set(key, time.time_ns(), ex=int(ttl) if ttl else None, nx=True)
+        return await self.client.incr(key)
+
+
+def backend_from_env(prefix: str):
+    """Backend configurado por <PREFIX>_BACKEND (memory | redis | none) e <PREFIX>_URL."""
+    kind = os.getenv(f'{prefix}_BACKEND', 'memory')
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(f"{prefix}_BACKEND=redis requires the 'redis' package") from None
+        return RedisBackend(redis.from_url(os.getenv(f'{prefix}_URL', 'redis://localhost:6379/0')))
+    return MemoryBackend(maxsize=int(os.getenv(f'{prefix}_SIZE', 10_000)))
+
+
+class VersionedCache:
+    """Cache read-through por dono (owner_id), invalidado por troca de versão.
+
+    Cada dono tem um número de versão; as chaves dos itens incluem a versão. Invalidar
+    é só incrementar a versão: os itens antigos deixam de ser encontrados e expiram
+    sozinhos (TTL / LRU). Com backend=None o cache fica desligado.
+
+    A versão também expira após `ttl`: com o backend em memória e vários workers, uma
+    escrita só troca a versão no worker que a atendeu, e os outros (inclusive o 304 do
+    ETag, que só olha a versão) servem dados antigos por no máximo `ttl` segundos.
+    """
+
+    def __init__(self, backend, namespace: str, ttl: float = 30):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _version_key(self, owner_id) -> str:
+        return f'{self.namespace}:{owner_id}:version'
+
+    async def version(self, owner_id) -> int | None:
+        """Versão atual dos dados do dono (None com o cache desligado)."""
+        if self.backend is None:
+            return None
+        version = await self.backend.get(self._version_key(owner_id))
+        if version is None:
+            version = await self.backend.bump(self._version_key(owner_id), ttl=self.ttl)
+        return int(version)
+
+    async def get_or_set(self, owner_id, key: str, producer, version: int | None = None):
+        """Devolve o valor em cache ou chama `await producer()` e guarda o resultado."""
+        if self.backend is None:
+            return await producer()
+        if version is None:
+            version = await self.version(owner_id)
+        item_key = f'{self.namespace}:{owner_id}:v{version}:{key}'
+        value = await self.backend.get(item_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await producer()
+        if value is not None:
+            await self.backend.set(item_key, value, ttl=self.ttl)
+        return value
+
+    async def invalidate(self, owner_id):
+        if self.backend is not None:
+            self.invalidations += 1
+            await self.backend.bump(self._version_key(owner_id), ttl=self.ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+# GET condicional (ETag / If-None-Match) -----------------------------------------
+def to_json(data) -> bytes:
+    """Serializa a resposta uma única vez, no formato guardado pelo cache.
+
+    Tipos nativos (dicts de colunas) vão direto para o orjson; o jsonable_encoder só é
+    usado como fallback para outros objetos.
+    """
+    return orjson.dumps(data, default=jsonable_encoder)
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str, exists: bool = True) -> bool:
+    """`*` só casa quando existe uma representação atual (RFC 9110), então quem ainda
+    não sabe se o item existe passa exists=False."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')]
+    return (exists and '*' in candidates) or etag in candidates
+
+
+async def cached_json_response(request: Request, cache: VersionedCache, owner_id, key: str, producer):
+    """Resposta JSON servida pelo cache, com ETag e suporte a If-None-Match.
+
+    O ETag vem da versão dos dados do dono, então um cliente com o ETag atual recebe
+    304 antes de qualquer consulta ou serialização. Com o cache desligado o ETag é o
+    hash do conteúdo (economiza banda, mas não a consulta). Devolve None quando o
+    `producer` devolve None (item inexistente).
+    """
+    headers = {'Cache-Control': 'private, no-cache'}
+    version = await cache.version(owner_id)
+    if version is not None:
+        headers['ETag'] = make_etag(cache.namespace, owner_id, version, key)
+        if etag_matches(request.headers.get('if-none-match'), headers['ETag'], exists=False):
+            return Response(status_code=304, headers=headers)
+
+    content = await cache.get_or_set(owner_id, key, producer, version=version)
+    if content is None:
+        return None
+    if version is None:
+        headers['ETag'] = make_etag(hashlib.sha1(content).hexdigest())
+    if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type='application/json', headers=headers)
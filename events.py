@@ -0,0 +1,233 @@
+# Eventos de mudança nos todos de cada usuário (GET /todos/events, Server-Sent Events).
+#
+# Os clientes faziam polling em GET / para descobrir mudanças. As rotas de escrita
+# publicam um evento (created / updated / deleted, com os ids) depois do commit e cada
+# conexão aberta pelo dono o recebe.
+#
+# Fan-out: o EventHub de cada worker mantém user_id -> conexões, cada uma com uma fila
+# limitada. O evento é serializado uma única vez e colocado nas filas sem esperar: uma
+# conexão lenta não atrasa as outras nem a rota que publicou. Se a fila de uma conexão
+# enche, os eventos pendentes dela são descartados e trocados por um único "resync" (o
+# cliente recarrega a lista), então a memória por conexão nunca passa de `queue_size`.
+#
+# Broker: com vários workers o evento precisa chegar às conexões abertas nos outros.
+# TODO_EVENTS_BACKEND=memory (padrão, só o próprio worker) | redis (TODO_EVENTS_URL,
+# pub/sub com um canal por usuário, assinado só pelos workers com conexões dele) | none.
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+import orjson
+
+
+logger = logging.getLogger('events')
+
+
+def format_event(event_type: str, payload: bytes) -> bytes:
+    return b'event: ' + event_type.encode() + b'\ndata: ' + payload + b'\n\n'
+
+
+RESYNC = ('resync', format_event('resync', b'{"type":"resync"}'))
+
+
+class Subscription:
+    """Uma conexão: fila limitada dos eventos (tipo, bytes já no formato SSE)."""
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, event: tuple[str, bytes]) -> bool:
+        """Enfileira sem bloquear. Com a fila cheia, troca os pendentes por um resync."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return False
+
+    async def get(self, timeout: float | None = None) -> tuple[str, bytes] | None:
+        """Próximo evento, ou None se nenhum chegar em `timeout` segundos."""
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class MemoryBroker:
+    """Sem broker externo: o evento só chega às conexões do próprio worker."""
+
+    def __init__(self):
+        self.deliver = None
+
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def subscribe(self, user_id: int):
+        pass
+
+    async def unsubscribe(self, user_id: int):
+        pass
+
+    async def publish(self, user_id: int, payload: bytes):
+        if self.deliver is not None:
+            self.deliver(user_id, payload)
+
+    async def stop(self):
+        self.deliver = None
+
+
+class RedisBroker:
+    """Pub/sub compartilhado entre workers, para um cliente compatível com redis.asyncio.
+
+    Cada worker assina só os canais dos usuários com conexões abertas nele.
+    """
+
+    def __init__(self, client, prefix: str = 'todo_events'):
+        self.client = client
+        self.prefix = prefix
+        self.pubsub = None
+        self.deliver = None
+        self._listener = None
+
+    def channel(self, user_id: int) -> str:
+        return f'{self.prefix}:{user_id}'
+
+    async def start(self, deliver):
+        self.deliver = deliver
+        self.pubsub = self.client.pubsub()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                if not self.pubsub.subscribed:
+                    await asyncio.sleep(1.0)
+                    continue
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # conexão perdida: o cliente reconecta e refaz as assinaturas
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None and message['type'] == 'message':
+                channel = message['channel']
+                channel = channel.decode() if isinstance(channel, bytes) else channel
+                self.deliver(int(channel.rpartition(':')[2]), message['data'])
+
+    async def subscribe(self, user_id: int):
+        await self.pubsub.subscribe(self.channel(user_id))
+
+    async def unsubscribe(self, user_id: int):
+        await self.pubsub.unsubscribe(self.channel(user_id))
+
+    async def publish(self, user_id: int, payload: bytes):
+        await self.client.publish(self.channel(user_id), payload)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+
+def broker_from_env(prefix: str):
+    """Broker configurado por <PREFIX>_BACKEND (memory | redis | none) e <PREFIX>_URL."""
+    kind = os.getenv(f'{prefix}_BACKEND', 'memory')
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(f"{prefix}_BACKEND=redis requires the 'redis' package") from None
+        return RedisBroker(redis.from_url(os.getenv(f'{prefix}_URL', 'redis://localhost:6379/0')))
+    return MemoryBroker()
+
+
+class EventHub:
+    """Publica eventos por usuário e os distribui às conexões abertas neste worker.
+
+    Com broker=None os eventos ficam desligados: publish não faz nada.
+    """
+
+    def __init__(self, broker, queue_size: int = 100):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.subscriptions: dict[int, set[Subscription]] = {}
+        self._started = False
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.publish_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.broker is not None
+
+    async def _start(self):
+        if not self._started:
+            self._started = True
+            await self.broker.start(self.deliver)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        await self._start()
+        subscription = Subscription(self.queue_size)
+        subscriptions = self.subscriptions.setdefault(user_id, set())
+        subscriptions.add(subscription)
+        if len(subscriptions) == 1:
+            await self.broker.subscribe(user_id)
+        try:
+            yield subscription
+        finally:
+            subscriptions.discard(subscription)
+            if not subscriptions and self.subscriptions.get(user_id) is subscriptions:
+                del self.subscriptions[user_id]
+                await self.broker.unsubscribe(user_id)
+
+    async def publish(self, user_id: int, event_type: str, **data):
+        """Publica o evento. Erros do broker são registrados e não propagados: o evento é
+        chamado depois do commit, e uma escrita já gravada não pode falhar por ele."""
+        if self.broker is None:
+            return
+        try:
+            await self.broker.publish(user_id, orjson.dumps({'type': event_type, **data}))
+        except Exception:
+            self.publish_errors += 1
+            logger.exception('Failed to publish %s event for user %s', event_type, user_id)
+            return
+        self.published += 1
+
+    def deliver(self, user_id: int, payload: bytes):
+        """Coloca o evento (vindo do broker) nas filas das conexões do usuário neste worker."""
+        subscriptions = self.subscriptions.get(user_id)
+        if not subscriptions:
+            return
+        event_type = orjson.loads(payload)['type']
+        event = (event_type, format_event(event_type, payload))
+        for subscription in subscriptions:
+            if subscription.put(event):
+                self.delivered += 1
+            else:
+                self.overflows += 1
+
+    async def stop(self):
+        if self._started:
+            self._started = False
+            await self.broker.stop()
+
+    def stats(self) -> dict:
+        return {'connections': sum(len(subscriptions) for subscriptions in self.subscriptions.values()),
+                'published': self.published, 'delivered': self.delivered, 'overflows': self.overflows,
+                'publish_errors': self.publish_errors}
@@ -0,0 +1,111 @@
+# Hashing de senhas fora do event loop.
+#
+# O bcrypt consome ~100-300 ms de CPU por chamada. Executado diretamente dentro de
+# uma rota "async def", ele trava todas as outras requisições do worker. Aqui as
+# chamadas são enviadas para um pool (threads ou processos) com limite de
+# concorrência e de fila: quando a fila enche, a requisição é recusada com 503
+# em vez de se acumular.
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+import metrics
+
+
+load_dotenv()
+
+bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _run_timed(operation: str, args: tuple, submitted_at: float):
+    """Executa no worker e devolve o resultado junto com os instantes de início e fim."""
+    started_at = time.monotonic()
+    if operation == 'hash':
+        result = bcrypt_context.hash(*args)
+    else:
+        result = bcrypt_context.verify(*args)
+    return result, submitted_at, started_at, time.monotonic()
+
+
+class PasswordHasher:
+    """Executa bcrypt hash/verify em um pool limitado e coleta métricas de fila e de tempo."""
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 64, executor: str = 'thread'):
+        if executor not in ('thread', 'process'):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor_kind = executor
+        self._executor: Executor | None = None
+        self._in_flight = 0
+        self._metrics = {
+            'calls': 0,
+            'rejected': 0,
+            'queue_wait_seconds_total': 0.0,
+            'queue_wait_seconds_max': 0.0,
+            'hash_seconds_total': 0.0,
+            'hash_seconds_max': 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        # Criado sob demanda: importar o módulo não deve iniciar threads nem processos.
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+        return self._executor
+
+    async def _submit(self, operation: str, *args):
+        # Até max_workers chamadas rodam ao mesmo tempo; outras max_queue podem aguardar.
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self._metrics['rejected'] += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail='Server busy, try again later.',
+                                headers={'Retry-After': '1'})
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, submitted_at, started_at, finished_at = await loop.run_in_executor(
+                self._get_executor(), _run_timed, operation, args, time.monotonic())
+        finally:
+            self._in_flight -= 1
+
+        queue_wait = started_at - submitted_at
+        hash_time = finished_at - started_at
+        metrics.record('hash_seconds', queue_wait + hash_time)
+        self._metrics['calls'] += 1
+        self._metrics['queue_wait_seconds_total'] += queue_wait
+        self._metrics['queue_wait_seconds_max'] = max(self._metrics['queue_wait_seconds_max'], queue_wait)
+        self._metrics['hash_seconds_total'] += hash_time
+        self._metrics['hash_seconds_max'] = max(self._metrics['hash_seconds_max'], hash_time)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit('hash', password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit('verify', password, hashed_password)
+
+    def stats(self) -> dict:
+        return {**self._metrics, 'in_flight': self._in_flight,
+                'max_workers': self.max_workers, 'max_queue': self.max_queue}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue=int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 64)),
+    executor=os.getenv('PASSWORD_HASH_EXECUTOR', 'thread'),
+)
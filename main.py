@@ -1,23 +1,84 @@
-from fastapi import FastAPI
-import models
-from database import engine
+import weakref
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from database import dispose_engines, get_async_engine, pool_status
+from hashing import password_hasher
+from ratelimit import login_rate_limiter
+from revocation import revocation_list
+from replicas import dispose_replica_engines, get_replica_engines, replica_router
+from sharding import dispose_shard_engines, get_shard_engines, shard_router
+from metrics import MetricsMiddleware, instrument_engine, render_prometheus
+from slow_queries import slow_query_log
 from routers import auth, todos, admin, users
 
 
-app = FastAPI()
+# O schema do banco é responsabilidade do Alembic (`alembic upgrade head` no deploy):
+# iniciar a aplicação não conecta no banco nem cria/inspeciona tabelas. O engine é
+# criado sob demanda e a primeira conexão só é aberta pela primeira requisição.
+
+router = APIRouter()
+
+_instrumented_engines = weakref.WeakSet()
 
-# A linha do código abaixo será executado somente se o "todo database" não existir.
-models.Base.metadata.create_all(bind=engine)
 
-@app.get('/healthy')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mede comandos SQL, tempo de banco e consultas lentas (ver /metrics e /admin/slow-queries).
+    # Só registra hooks: o engine é montado aqui, mas nenhuma conexão é aberta.
+    for async_engine in (get_async_engine(), *get_replica_engines(), *get_shard_engines()):
+        engine = async_engine.sync_engine
+        if engine not in _instrumented_engines:
+            instrument_engine(engine)
+            slow_query_log.install(engine)
+            _instrumented_engines.add(engine)
+    yield
+    await dispose_engines()
+    await dispose_replica_engines()
+    await dispose_shard_engines()
+    await todos.todo_events.stop()
+    password_hasher.shutdown()
+
+
+@router.get('/healthy')
 def health_check():
     return{'status': 'Healthy'}
 
 
-app.include_router(auth.router)
-app.include_router(todos.router)
-app.include_router(admin.router)
-app.include_router(users.router)
+@router.get('/metrics', response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_prometheus({
+        'db_pool': pool_status(),
+        'password_hasher': password_hasher.stats(),
+        'token_cache': auth.token_cache.stats(),
+        'todo_cache': todos.todo_cache.stats(),
+        'user_cache': users.user_cache.stats(),
+        'login_rate_limiter': login_rate_limiter.stats(),
+        'token_revocation': revocation_list.stats(),
+        'read_routing': replica_router.stats(),
+        'todo_shards': shard_router.stats(),
+        'todo_events': todos.todo_events.stats(),
+    }), media_type='text/plain; version=0.0.4')
+
+
+def create_app() -> FastAPI:
+    # ORJSONResponse: as rotas que devolvem dicts/listas são serializadas com orjson.
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+    # Mede duração, comandos SQL, tempo de banco e de autenticação de cada rota (ver /metrics).
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(router)
+    app.include_router(auth.router)
+    app.include_router(todos.router)
+    app.include_router(admin.router)
+    app.include_router(users.router)
+    return app
+
+
+# `uvicorn main:app` (ou `uvicorn main:create_app --factory`)
+app = create_app()
 
 # Observações:
 
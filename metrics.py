@@ -0,0 +1,188 @@
+# Instrumentação por rota: duração da requisição, quantidade de comandos SQL, tempo
+# gasto no banco e na autenticação. Os valores são acumulados em memória (por processo)
+# e expostos no formato de texto do Prometheus em /metrics.
+
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+
+# Limites dos buckets do histograma de duração, em segundos.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# SERVER_TIMING=1 devolve os tempos de cada requisição no header Server-Timing.
+SERVER_TIMING = os.getenv('SERVER_TIMING', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Acumuladores da requisição atual. Os hooks do SQLAlchemy e o get_current_user
+# escrevem aqui; o middleware lê ao final da requisição.
+current_request: ContextVar[dict | None] = ContextVar('current_request', default=None)
+# Scope ASGI da requisição atual; depois do roteamento contém a rota encontrada.
+current_scope: ContextVar[dict | None] = ContextVar('current_scope', default=None)
+
+
+def new_request_timings() -> dict:
+    return {'db_statements': 0, 'db_seconds': 0.0, 'auth_seconds': 0.0, 'hash_seconds': 0.0}
+
+
+def current_route() -> str | None:
+    """'MÉTODO /rota/{param}' da requisição atual, ou None fora de uma requisição."""
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get('route')
+    return f"{scope['method']} {route.path if route is not None else scope['path']}"
+
+
+def record(name: str, seconds: float):
+    """Soma `seconds` ao tempo `name` ('auth_seconds', 'hash_seconds', ...) da requisição atual."""
+    timings = current_request.get()
+    if timings is not None:
+        timings[name] += seconds
+
+
+class RouteMetrics:
+    """Contadores e histograma de duração, agrupados por (método, rota, status)."""
+
+    def __init__(self):
+        self.routes: dict[tuple, dict] = {}
+
+    def observe(self, method: str, route: str, status_code: int, duration: float, timings: dict):
+        key = (method, route, str(status_code))
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = {
+                'count': 0, 'duration_seconds': 0.0, 'buckets': [0] * len(DURATION_BUCKETS),
+                'db_statements': 0, 'db_seconds': 0.0, 'auth_seconds': 0.0, 'hash_seconds': 0.0,
+            }
+        metrics['count'] += 1
+        metrics['duration_seconds'] += duration
+        for index, limit in enumerate(DURATION_BUCKETS):
+            if duration <= limit:
+                metrics['buckets'][index] += 1
+        for name in ('db_statements', 'db_seconds', 'auth_seconds', 'hash_seconds'):
+            metrics[name] += timings[name]
+
+    def reset(self):
+        self.routes.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+def instrument_engine(engine):
+    """Registra os hooks before/after_cursor_execute que medem cada comando SQL."""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        timings = current_request.get()
+        if timings is not None:
+            timings['db_statements'] += 1
+            timings['db_seconds'] += elapsed
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede cada requisição HTTP e alimenta `route_metrics`."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = new_request_timings()
+        token = current_request.set(timings)
+        scope_token = current_scope.set(scope)
+        start = time.perf_counter()
+        status_code = 500
+        response_started_at = None
+        event_stream = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_started_at, event_stream
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                response_started_at = time.perf_counter()
+                event_stream = any(name.lower() == b'content-type' and value.startswith(b'text/event-stream')
+                                   for name, value in message.get('headers', []))
+                if self.server_timing:
+                    message.setdefault('headers', [])
+                    message['headers'] = [*message['headers'],
+                                          (b'server-timing', server_timing_header(timings, start).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            current_scope.reset(scope_token)
+            route = scope.get('route')
+            # Streams de eventos (SSE) ficam abertos por horas: a duração medida é só até
+            # o início da resposta, para não distorcer o histograma de latência da rota.
+            end = response_started_at if event_stream else time.perf_counter()
+            route_metrics.observe(scope['method'], route.path if route is not None else 'unmatched',
+                                  status_code, end - start, timings)
+
+
+def server_timing_header(timings: dict, start: float) -> str:
+    total = (time.perf_counter() - start) * 1000
+    return (f'db;dur={timings["db_seconds"] * 1000:.2f};desc="{timings["db_statements"]} queries", '
+            f'auth;dur={timings["auth_seconds"] * 1000:.2f}, hash;dur={timings["hash_seconds"] * 1000:.2f}, '
+            f'total;dur={total:.2f}')
+
+
+# Formato de texto do Prometheus ---------------------------------------------------
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus(gauges: dict[str, dict] | None = None) -> str:
+    """Métricas por rota + métricas de componentes (pool, hashing, caches) como gauges.
+
+    `gauges` mapeia um prefixo para um dicionário de valores numéricos, por exemplo
+    {'db_pool': pool_status()} vira db_pool_checkedout, db_pool_size, ...
+    """
+    lines = []
+    per_route = [
+        ('http_requests_total', 'counter', 'Total HTTP requests.', 'count'),
+        ('http_request_db_statements_total', 'counter', 'SQL statements executed.', 'db_statements'),
+        ('http_request_db_seconds_total', 'counter', 'Time spent executing SQL.', 'db_seconds'),
+        ('http_request_auth_seconds_total', 'counter', 'Time spent validating tokens.', 'auth_seconds'),
+        ('http_request_hash_seconds_total', 'counter', 'Time spent waiting for bcrypt.', 'hash_seconds'),
+    ]
+    for name, kind, help_text, field in per_route:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (method, route, status_code), metrics in route_metrics.routes.items():
+            lines.append(f'{name}{_labels(method=method, route=route, status=status_code)} {metrics[field]}')
+
+    name = 'http_request_duration_seconds'
+    lines += [f'# HELP {name} HTTP request duration.', f'# TYPE {name} histogram']
+    for (method, route, status_code), metrics in route_metrics.routes.items():
+        for limit, count in zip(DURATION_BUCKETS, metrics['buckets']):
+            lines.append(f'{name}_bucket{_labels(method=method, route=route, status=status_code, le=limit)} {count}')
+        lines.append(f'{name}_bucket{_labels(method=method, route=route, status=status_code, le="+Inf")} '
+                     f'{metrics["count"]}')
+        lines.append(f'{name}_sum{_labels(method=method, route=route, status=status_code)} '
+                     f'{metrics["duration_seconds"]}')
+        lines.append(f'{name}_count{_labels(method=method, route=route, status=status_code)} {metrics["count"]}')
+
+    for prefix, values in (gauges or {}).items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                lines += [f'# TYPE {prefix}_{key} gauge', f'{prefix}_{key} {float(value)}']
+
+    return '\n'.join(lines) + '\n'
@@ -2,7 +2,7 @@
 # we are going to be creating within our database in the future.
 
 from database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index
 
 # Users (1) ---- (0:n) Todos
 # Relação 1:n. Um usuário pode ter zero ou vários "todos".
@@ -30,6 +30,48 @@ class Todos(Base):
     complete = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
+    # Todas as consultas do router de todos filtram por owner_id (e normalmente por id,
+    # complete ou priority). Sem estes índices cada consulta vira um full scan.
+    __table_args__ = (
+        Index('ix_todos_owner_id_id', 'owner_id', 'id'),
+        Index('ix_todos_owner_id_complete_priority', 'owner_id', 'complete', 'priority'),
+    )
+
+
+# Refresh tokens: opacos e de longa duração, trocados por novos access tokens sem
+# verificar a senha. Só o sha256 do token é guardado. A linha é apagada na rotação e
+# no logout, e as expiradas a cada login/refresh (pelo índice em expires_at).
+class RefreshTokens(Base):
+    __tablename__ = 'refresh_tokens'
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String, unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    expires_at = Column(Integer, nullable=False, index=True)  # epoch em segundos, como o 'exp' do JWT
+
+
+# Access tokens revogados antes de expirar (logout) e usuários com todos os tokens
+# revogados (jti nulo: vale para todo token do usuário emitido até revoked_at).
+# Os workers leem esta tabela periodicamente para a lista em memória (ver revocation.py).
+class RevokedTokens(Base):
+    __tablename__ = 'revoked_tokens'
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, nullable=True)
+    user_id = Column(Integer, nullable=False)
+    revoked_at = Column(Integer, nullable=False, index=True)
+    expires_at = Column(Integer, nullable=False)  # depois disso a revogação não é mais necessária
+
+# Blocos de ids reservados por nome de sequência (hi/lo). Com os todos divididos em
+# vários shards, cada banco geraria os seus próprios ids e eles se repetiriam entre os
+# shards; os ids passam a vir desta tabela, no banco principal (ver sharding.py).
+class IdBlocks(Base):
+    __tablename__ = 'id_blocks'
+
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)  # primeiro id ainda não reservado
+
+
 """
 Revisando os tipos de relacionamento:
 
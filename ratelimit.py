@@ -0,0 +1,150 @@
+# Limite de tentativas de login.
+#
+# Cada tentativa em POST /auth/token custa uma consulta ao banco e um bcrypt verify
+# (~100-300 ms de CPU). O limitador recusa o excesso com 429 antes de qualquer uma
+# das duas, por IP do cliente e por username (credential stuffing distribui as
+# tentativas entre IPs, mas repete os usernames).
+#
+# Algoritmo: token bucket na forma GCRA. Para cada chave guardamos só o "instante
+# teórico" em que o balde volta a ficar cheio (um float), com expiração nesse mesmo
+# instante: chaves inativas somem sozinhas e o estado é O(chaves ativas).
+
+import os
+import time
+
+from fastapi import HTTPException, status
+
+from cache import LRUCache
+
+
+class MemoryRateLimitBackend:
+    """Estado local (por processo), em um LRU limitado a `maxsize` chaves."""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.lru = LRUCache(maxsize=maxsize)
+
+    async def hit(self, limits: list[tuple[str, int, float]]) -> float:
+        """Consome um token de cada chave (key, limit, period), só se todas permitirem.
+
+        Devolve 0 se permitido, senão os segundos até todas as chaves terem um token.
+        """
+        now = time.time()
+        updates = []
+        retry_after = 0.0
+        for key, limit, period in limits:
+            full_at = max(self.lru.get(key) or now, now) + period / limit
+            retry_after = max(retry_after, full_at - now - period)
+            updates.append((key, full_at))
+        if retry_after > 0:
+            return retry_after
+        for key, full_at in updates:
+            self.lru.set(key, full_at, expires_at=full_at)
+        return 0.0
+
+    def __len__(self):
+        return len(self.lru)
+
+    def clear(self):
+        self.lru.clear()
+
+
+# Mesmo cálculo do MemoryRateLimitBackend, executado de forma atômica no Redis.
+# KEYS: as chaves; ARGV: now e, para cada chave, o intervalo e o período.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local retry_after = 0
+local updates = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[2 * i])
+    local period = tonumber(ARGV[2 * i + 1])
+    local full_at = math.max(tonumber(redis.call('GET', key) or now), now) + interval
+    retry_after = math.max(retry_after, full_at - now - period)
+    updates[i] = full_at
+end
+if retry_after > 0 then
+    return tostring(retry_after)
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tostring(updates[i]), 'PX', math.ceil((updates[i] - now) * 1000))
+end
+return '0'
+"""
+
+
+class RedisRateLimitBackend:
+    """Estado compartilhado entre workers, para um cliente compatível com redis.asyncio."""
+
+    def __init__(self, client, prefix: str = 'ratelimit'):
+        self.client = client
+        self.prefix = prefix
+
+    async def hit(self, limits: list[tuple[str, int, float]]) -> float:
+        arguments = [time.time()]
+        for _, limit, period in limits:
+            arguments += [period / limit, period]
+        retry_after = await self.client.eval(GCRA_SCRIPT, len(limits),
+                                             *(f'{self.prefix}:{key}' for key, _, _ in limits), *arguments)
+        return float(retry_after)
+
+
+def rate_limit_backend_from_env(prefix: str):
+    """Backend configurado por <PREFIX>_BACKEND (memory | redis | none) e <PREFIX>_URL."""
+    kind = os.getenv(f'{prefix}_BACKEND', 'memory')
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(f"{prefix}_BACKEND=redis requires the 'redis' package") from None
+        return RedisRateLimitBackend(redis.from_url(os.getenv(f'{prefix}_URL', 'redis://localhost:6379/0')))
+    return MemoryRateLimitBackend(maxsize=int(os.getenv(f'{prefix}_SIZE', 100_000)))
+
+
+class RateLimiter:
+    """Aplica vários limites (nome -> (tentativas, período em segundos)) a uma requisição.
+
+    Com backend=None o limitador fica desligado.
+    """
+
+    def __init__(self, backend, limits: dict[str, tuple[int, float]]):
+        self.backend = backend
+        self.limits = limits
+        self.allowed = 0
+        self.rejected = 0
+
+    async def check(self, **keys):
+        """Consome uma tentativa de cada chave (ex.: ip=..., username=...) ou levanta 429.
+
+        As chaves são verificadas juntas: uma tentativa recusada por um dos limites não
+        consome nada dos outros (ex.: do IP, quando o username está bloqueado).
+        """
+        if self.backend is None:
+            return
+        retry_after = await self.backend.hit([(f'{name}:{value}', *self.limits[name])
+                                              for name, value in keys.items()])
+        if retry_after > 0:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail='Too many login attempts, try again later.',
+                                headers={'Retry-After': str(max(1, round(retry_after)))})
+        self.allowed += 1
+
+    def clear(self):
+        # Só o estado local; o do Redis é compartilhado entre os workers e expira sozinho.
+        if isinstance(self.backend, MemoryRateLimitBackend):
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        stats = {'allowed': self.allowed, 'rejected': self.rejected}
+        if isinstance(self.backend, MemoryRateLimitBackend):
+            stats['keys'] = len(self.backend)
+        return stats
+
+
+# LOGIN_RATE_LIMIT_BACKEND=memory (padrão, por processo) | redis (LOGIN_RATE_LIMIT_URL) | none.
+# Com vários workers use redis: no backend em memória cada worker tem os seus próprios limites.
+login_rate_limiter = RateLimiter(rate_limit_backend_from_env('LOGIN_RATE_LIMIT'), {
+    'ip': (int(os.getenv('LOGIN_RATE_LIMIT_PER_IP', 20)), float(os.getenv('LOGIN_RATE_LIMIT_PERIOD', 60))),
+    'username': (int(os.getenv('LOGIN_RATE_LIMIT_PER_USERNAME', 5)), float(os.getenv('LOGIN_RATE_LIMIT_PERIOD', 60))),
+})
@@ -0,0 +1,141 @@
+# Roteamento de leituras para réplicas (opcional).
+#
+# DATABASE_REPLICA_URLS (URLs separadas por vírgula, no mesmo formato da DATABASE_URL)
+# liga o roteamento: as rotas GET usam uma réplica (em rodízio) e as rotas de escrita
+# usam sempre o primário. Sem réplicas configuradas tudo vai para o primário.
+#
+# Read-your-writes: depois de um commit com escritas, o usuário fica fixado no primário
+# por READ_YOUR_WRITES_SECONDS, para não ler da réplica (com atraso de replicação) um
+# estado anterior à própria escrita. As fixações ficam no backend READ_PIN_BACKEND
+# (memory | redis, ver cache.backend_from_env); com vários workers use redis.
+
+import itertools
+import os
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from cache import backend_from_env
+from database import AsyncSessionLocal, create_request_engine
+
+
+# Marca as sessões que escreveram. Vale para qualquer sessão: o ReplicaRouter só olha
+# a marca nas sessões do primário que ele mesmo abriu.
+@event.listens_for(Session, 'after_flush')
+def _mark_flush(session, flush_context):
+    session.info['pending_writes'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['pending_writes'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_commit(session):
+    if session.info.pop('pending_writes', False):
+        session.info['committed_writes'] = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop('pending_writes', None)
+
+
+class ReplicaRouter:
+    """Escolhe a sessão (primário ou réplica) de cada requisição."""
+
+    def __init__(self, primary, replicas=(), pin_backend=None, pin_seconds: int = 5):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._next_replica = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self.pin_backend = pin_backend
+        self.pin_seconds = pin_seconds
+        self.reads = {'primary': 0, 'replica': 0, 'pinned': 0}
+
+    async def is_pinned(self, user_id) -> bool:
+        if user_id is None or self.pin_backend is None:
+            return False
+        return await self.pin_backend.get(f'read_pin:{user_id}') is not None
+
+    async def pin(self, user_id):
+        if user_id is not None and self.pin_backend is not None:
+            await self.pin_backend.set(f'read_pin:{user_id}', 1, ttl=self.pin_seconds)
+
+    @asynccontextmanager
+    async def read_session(self, user_id=None):
+        """Sessão para rotas só de leitura: uma réplica, ou o primário logo após uma escrita."""
+        if not self.replicas:
+            self.reads['primary'] += 1
+            sessionmaker = self.primary
+        elif await self.is_pinned(user_id):
+            self.reads['pinned'] += 1
+            sessionmaker = self.primary
+        else:
+            self.reads['replica'] += 1
+            sessionmaker = self.replicas[next(self._next_replica)]
+        async with sessionmaker() as db:
+            yield db
+
+    @asynccontextmanager
+    async def write_session(self, user_id=None):
+        """Sessão no primário; se houver commit com escritas, fixa o usuário no primário."""
+        async with self.primary() as db:
+            yield db
+            if self.replicas and db.sync_session.info.pop('committed_writes', False):
+                await self.pin(user_id)
+
+    def stats(self) -> dict:
+        return {'replicas': len(self.replicas), **{f'reads_{name}': count for name, count in self.reads.items()}}
+
+
+def replica_urls() -> list[str]:
+    return [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+
+class LazySessionmaker:
+    """async_sessionmaker para outra URL (réplica, shard), com o engine criado no primeiro uso."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = None
+        self._sessionmaker = None
+
+    def get_engine(self):
+        if self.engine is None:
+            self.engine = create_request_engine(self.url)
+            self._sessionmaker = async_sessionmaker(bind=self.engine, class_=AsyncSession, autoflush=False,
+                                                    expire_on_commit=False)
+        return self.engine
+
+    def __call__(self) -> AsyncSession:
+        self.get_engine()
+        return self._sessionmaker()
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+replica_sessionmakers = [LazySessionmaker(url) for url in replica_urls()]
+
+
+def get_replica_engines() -> list:
+    """Engines das réplicas (mesmas opções de pool do primário), criados no primeiro uso."""
+    return [sessionmaker.get_engine() for sessionmaker in replica_sessionmakers]
+
+
+async def dispose_replica_engines():
+    for sessionmaker in replica_sessionmakers:
+        await sessionmaker.dispose()
+
+
+replica_router = ReplicaRouter(
+    AsyncSessionLocal,
+    replica_sessionmakers,
+    pin_backend=backend_from_env('READ_PIN'),
+    pin_seconds=int(os.getenv('READ_YOUR_WRITES_SECONDS', 5)),
+)
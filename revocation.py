@@ -0,0 +1,148 @@
+# Lista de revogação dos access tokens, consultada em toda requisição autenticada.
+#
+# Os access tokens são JWTs: validá-los não exige o banco, e a revogação também não
+# deve exigir. Cada worker mantém em memória:
+#   - um filtro de Bloom com os jti revogados: para a grande maioria dos tokens (não
+#     revogados) a resposta "não está na lista" sai de alguns bits de um array fixo;
+#   - o conjunto exato jti -> exp, consultado só quando o Bloom diz "talvez";
+#   - user_id -> instante da revogação de todos os tokens do usuário (exclusão).
+# As revogações são gravadas na tabela revoked_tokens e cada worker busca as novas a
+# cada TOKEN_REVOCATION_SYNC_SECONDS, então um logout feito em outro worker vale em
+# todos em poucos segundos, sem uma consulta por requisição.
+
+import hashlib
+import math
+import os
+import time
+
+from sqlalchemy import delete, select
+
+from database import AsyncSessionLocal
+from models import RevokedTokens
+
+
+# Revogações gravadas há até este tempo antes da última sincronização são lidas de novo.
+SYNC_OVERLAP_SECONDS = 60
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre um bytearray, dimensionado para `capacity` itens."""
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode()).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:16], 'big')
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """jti e usuários revogados, com sincronização periódica pela tabela revoked_tokens."""
+
+    def __init__(self, capacity: int = 100_000, sync_interval: float = 5, session_factory=AsyncSessionLocal):
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.session_factory = session_factory
+        self.bloom = BloomFilter(capacity)
+        self.tokens: dict[str, int] = {}  # jti -> exp
+        self.users: dict[int, tuple[int, int]] = {}  # user_id -> (revoked_at, expires_at)
+        self._synced_at = 0
+        self._next_sync = 0.0
+        self.bloom_hits = 0
+        self.false_positives = 0
+
+    def revoke(self, jti: str, expires_at: int):
+        self.tokens[jti] = expires_at
+        self.bloom.add(jti)
+
+    def revoke_user(self, user_id: int, revoked_at: int, expires_at: int):
+        current = self.users.get(user_id)
+        if current is None or current[0] < revoked_at:
+            self.users[user_id] = (revoked_at, expires_at)
+
+    def is_revoked(self, jti: str | None, user_id: int, issued_at: int | None) -> bool:
+        revoked_user = self.users.get(user_id)
+        if revoked_user is not None and (issued_at is None or issued_at <= revoked_user[0]):
+            return True
+        if jti is None or jti not in self.bloom:
+            return False
+        self.bloom_hits += 1
+        if jti in self.tokens:
+            return True
+        self.false_positives += 1
+        return False
+
+    def prune(self, now: int | None = None):
+        """Remove revogações de tokens que já expiraram; o Bloom é reconstruído sem elas."""
+        now = int(time.time()) if now is None else now
+        expired = [jti for jti, expires_at in self.tokens.items() if expires_at <= now]
+        for jti in expired:
+            del self.tokens[jti]
+        for user_id in [user_id for user_id, (_, expires_at) in self.users.items() if expires_at <= now]:
+            del self.users[user_id]
+        if expired:
+            self.bloom = BloomFilter(self.capacity)
+            for jti in self.tokens:
+                self.bloom.add(jti)
+
+    async def sync(self, force: bool = False):
+        """Carrega as revogações gravadas por outros workers (no máximo a cada sync_interval)."""
+        now = time.monotonic()
+        if self.sync_interval is None or (not force and now < self._next_sync):
+            return
+        self._next_sync = now + self.sync_interval
+        # Janela por revoked_at com folga (e não por id): transações concorrentes podem
+        # gravar fora de ordem. Aplicar a mesma revogação duas vezes não tem efeito.
+        started_at = int(time.time())
+        async with self.session_factory() as db:
+            result = await db.execute(select(RevokedTokens)
+                                      .where(RevokedTokens.revoked_at >= self._synced_at - SYNC_OVERLAP_SECONDS)
+                                      .where(RevokedTokens.expires_at > started_at))
+            for row in result.scalars():
+                if row.jti is None:
+                    self.revoke_user(row.user_id, row.revoked_at, row.expires_at)
+                else:
+                    self.revoke(row.jti, row.expires_at)
+        self._synced_at = started_at
+        self.prune()
+
+    async def record(self, db, user_id: int, expires_at: int, jti: str | None = None):
+        """Grava a revogação na sessão (o commit fica com quem chama) e a aplica neste worker.
+
+        Sem `jti`, revoga todos os tokens do usuário emitidos até agora. As linhas que já
+        não têm efeito são apagadas na mesma transação, então a tabela não cresce.
+        """
+        now = int(time.time())
+        await db.execute(delete(RevokedTokens).where(RevokedTokens.expires_at <= now))
+        db.add(RevokedTokens(jti=jti, user_id=user_id, revoked_at=now, expires_at=expires_at))
+        if jti is None:
+            self.revoke_user(user_id, now, expires_at)
+        else:
+            self.revoke(jti, expires_at)
+
+    def clear(self):
+        self.bloom = BloomFilter(self.capacity)
+        self.tokens.clear()
+        self.users.clear()
+        self._synced_at = 0
+        self._next_sync = 0.0
+
+    def stats(self) -> dict:
+        return {'tokens': len(self.tokens), 'users': len(self.users), 'bloom_bytes': len(self.bloom.bits),
+                'bloom_hits': self.bloom_hits, 'false_positives': self.false_positives}
+
+
+revocation_list = RevocationList(
+    capacity=int(os.getenv('TOKEN_REVOCATION_CAPACITY', 100_000)),
+    sync_interval=float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', 5)),
+)
@@ -1,11 +1,25 @@
-from typing import Annotated
+import asyncio
+import time
+from functools import partial
+from typing import Annotated, Literal
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
+from fastapi.responses import StreamingResponse
+import orjson
 from models import Todos as TodosModel
 from models import Users as UserModel
-from database import SessionLocal
-from .auth import get_current_user
+from models import RefreshTokens as RefreshTokensModel
+from database import write_lock
+from replicas import replica_router
+from sharding import shard_router
+from slow_queries import slow_query_log
+from revocation import revocation_list
+from .auth import get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from .todos import todo_cache, todo_events, todos_changed, parse_fields, TodoOut, STATS_QUERY, empty_stats, \
+    add_to_stats
+from .users import user_cache, UserOut
 
 
 router = APIRouter(
@@ -14,16 +28,67 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# Escritas (e leituras que precedem uma escrita) vão para o primário; as rotas só de
+# leitura usam get_read_db, que pode ir para uma réplica (ver replicas.py).
+async def get_db(user: user_dependency):
+    async with replica_router.write_session(user.get('id') if user else None) as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(get_current_user)]
+async def get_read_db(user: user_dependency):
+    async with replica_router.read_session(user.get('id') if user else None) as db:
+        yield db
+
+
+# Os todos ficam divididos entre os shards (ver sharding.py): as rotas de todos do admin
+# consultam todos eles.
+def get_todo_shards() -> list:
+    return list(shard_router.shards.values())
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+shards_dependency = Annotated[list, Depends(get_todo_shards)]
+
+fields_query = Query(None, description='Comma-separated subset of the response fields.')
+
+# Quantidade de linhas lidas do cursor do banco por vez durante a exportação.
+STREAM_BATCH_SIZE = 500
+
+
+def stream_table(sessions, columns, export_format: str) -> StreamingResponse:
+    """Exporta as colunas de todas as linhas da tabela sem carregá-las na memória.
+
+    As linhas são lidas com um cursor do lado do servidor (yield_per) e escritas na
+    resposta conforme chegam, como um array JSON ou como NDJSON (uma linha por objeto).
+    `sessions` são fábricas de sessão (uma por shard), lidas uma depois da outra.
+    """
+    # A sessão do get_db é fechada antes do corpo da resposta ser enviado, então o
+    # gerador abre as suas próprias sessões.
+    statement = select(*columns).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    async def generate():
+        first = True
+        if export_format == 'json':
+            yield b'['
+        for session in sessions:
+            async with session() as stream_db:
+                result = await stream_db.stream(statement)
+                async for row in result:
+                    line = orjson.dumps(row._asdict())
+                    if export_format == 'ndjson':
+                        yield line + b'\n'
+                    else:
+                        yield line if first else b',' + line
+                    first = False
+        if export_format == 'json':
+            yield b']'
+
+    media_type = 'application/x-ndjson' if export_format == 'ndjson' else 'application/json'
+    return StreamingResponse(generate(), media_type=media_type)
 
 
 
@@ -33,19 +98,54 @@ user_dependency = Annotated[dict, Depends(get_current_user)]
 # READ routers --------------------------------------------------------------
 
 # read_all_todos
-@router.get('/todo', status_code=status.HTTP_200_OK)
-async def read_all_todos(user: user_dependency, db: db_dependency):
+@router.get('/todo', status_code=status.HTTP_200_OK, response_model=list[TodoOut])
+async def read_all_todos(user: user_dependency, shards: shards_dependency,
+                         format: Literal['json', 'ndjson'] = 'json', fields: str | None = fields_query):
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed.')
-    return db.query(TodosModel).all()
+    # com o id do admin: depois de uma escrita dele as leituras vão para o primário
+    return stream_table([partial(shard.read_session, user.get('id')) for shard in shards],
+                        [getattr(TodosModel, name) for name in parse_fields(fields, TodoOut)], format)
 
 
 # read_all_users
-@router.get('/users', status_code=status.HTTP_200_OK)
-async def read_all_users(user: user_dependency, db: db_dependency):
+@router.get('/users', status_code=status.HTTP_200_OK, response_model=list[UserOut])
+async def read_all_users(user: user_dependency, db: read_db_dependency, format: Literal['json', 'ndjson'] = 'json',
+                         fields: str | None = fields_query):
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed.')
-    return db.query(UserModel).all()
+    return stream_table([partial(AsyncSession, bind=db.bind)],
+                        [getattr(UserModel, name) for name in parse_fields(fields, UserOut)], format)
+
+
+# read_stats
+@router.get('/stats', status_code=status.HTTP_200_OK)
+async def read_stats(user: user_dependency, shards: shards_dependency):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed.')
+
+    async def shard_stats(shard):
+        async with shard.read_session(user.get('id')) as db:
+            return (await db.execute(STATS_QUERY)).all()
+
+    # Uma consulta por shard, todas ao mesmo tempo; cada dono está em um único shard.
+    stats = {**empty_stats(), 'by_owner': {}}
+    results = await asyncio.gather(*(shard_stats(shard) for shard in shards))
+    for owner_id, complete, priority, count in (row for result in results for row in result):
+        add_to_stats(stats, complete, priority, count)
+        add_to_stats(stats['by_owner'].setdefault(str(owner_id), empty_stats()), complete, priority, count)
+    stats['by_priority'] = dict(sorted(stats['by_priority'].items()))
+    for owner_stats in stats['by_owner'].values():
+        owner_stats['by_priority'] = dict(sorted(owner_stats['by_priority'].items()))
+    return stats
+
+
+# read_slow_queries
+@router.get('/slow-queries', status_code=status.HTTP_200_OK)
+async def read_slow_queries(user: user_dependency):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed.')
+    return {'threshold_ms': slow_query_log.threshold_ms, 'queries': slow_query_log.snapshot()}
 
 
 
@@ -53,16 +153,32 @@ async def read_all_users(user: user_dependency, db: db_dependency):
 
 # delete_todo
 @router.delete('/todo/{todo_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+async def delete_todo(user: user_dependency, shards: shards_dependency, todo_id: int = Path(gt=0)):
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed.')
-    todo_model = db.query(TodosModel).filter(TodosModel.id == todo_id).first()
 
-    if todo_model is None:
+    # O dono (e portanto o shard) não é conhecido: o DELETE vai para todos os shards ao
+    # mesmo tempo. Os ids são únicos entre os shards, então no máximo um encontra o todo.
+    async def delete_from(shard):
+        async with shard.write_session(user.get('id')) as db:
+            async with write_lock():
+                result = await db.execute(delete(TodosModel).where(TodosModel.id == todo_id)
+                                          .returning(TodosModel.owner_id)
+                                          .execution_options(synchronize_session=False))
+                owner_ids = result.scalars().all()
+                await db.commit()
+        # o dono relê a lista assim que recebe o evento: fixa-o no primário, senão uma
+        # réplica atrasada preencheria o cache (já com a nova versão) com o todo apagado
+        for owner_id in set(owner_ids):
+            await shard.pin(owner_id)
+        return owner_ids
+
+    owner_ids = [owner_id for result in await asyncio.gather(*(delete_from(shard) for shard in shards))
+                 for owner_id in result]
+    if not owner_ids:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found.')
-
-    db.query(TodosModel).filter(TodosModel.id == todo_id).delete()
-    db.commit()
+    for owner_id in set(owner_ids):
+        await todos_changed(owner_id, 'deleted', [todo_id])
 
 
 # delete_user
@@ -70,12 +186,23 @@ async def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = P
 async def delete_user(user: user_dependency, db: db_dependency, user_id: int = Path(gt=0)):
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed.')
-    user_model = db.query(UserModel).filter(UserModel.id == user_id).first()
-
-    if user_model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found.')
-
-    db.query(UserModel).filter(UserModel.id == user_id).delete()
-    db.commit()
+    async with write_lock():
+        deleted_id = await db.scalar(delete(UserModel).where(UserModel.id == user_id)
+                                     .returning(UserModel.id)
+                                     .execution_options(synchronize_session=False))
+
+        if deleted_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found.')
+
+        # Os access tokens já emitidos deixam de valer (em todos os workers após a
+        # próxima sincronização) e os refresh tokens são apagados.
+        await db.execute(delete(RefreshTokensModel).where(RefreshTokensModel.user_id == user_id))
+        await revocation_list.record(db, user_id, int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+        await db.commit()
+    await todo_cache.invalidate(user_id)
+    await user_cache.invalidate(user_id)
+    # encerra os streams de eventos abertos pelo usuário
+    await todo_events.publish(user_id, 'user_deleted')
 
 
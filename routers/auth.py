@@ -1,11 +1,21 @@
+import hashlib
+import secrets
+import time
+import uuid
 from datetime import timedelta, datetime, timezone
 from typing import Annotated
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Request
 from pydantic import BaseModel
 from models import Users as UsersModel
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from models import RefreshTokens as RefreshTokensModel
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, write_lock
+from hashing import password_hasher
+from cache import LRUCache
+from ratelimit import login_rate_limiter
+from revocation import revocation_list
+import metrics
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
 import os
@@ -24,52 +34,111 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
+ACCESS_TOKEN_EXPIRE_MINUTES = 20
+# Refresh tokens: trocados em /auth/refresh por um novo access token sem bcrypt.
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', 30))
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Tokens já verificados, indexados pelo hash do token, até o seu 'exp'.
+# Os clientes reutilizam o mesmo token por toda a sua validade (20 minutos), então
+# o jwt.decode só é executado na primeira requisição com cada token.
+token_cache = LRUCache(maxsize=int(os.getenv('TOKEN_CACHE_SIZE', 10_000)), ttl=20 * 60)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 
-def authenticate_user(username: str, password: str, db: Session):
+async def authenticate_user(username: str, password: str, db: AsyncSession):
     """Autentica um usuário verificando username e senha."""
-    user = db.query(UsersModel).filter(UsersModel.username == username).first()
+    user = await db.scalar(select(UsersModel).where(UsersModel.username == username))
     
     if not user:
         return None
     
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None 
     
     return user  # Usuário autenticado
 
 
 def create_access_token(username: str, user_id: int, role:str, expires_delta: timedelta):
-    encode = {'sub': username, 'id': user_id, 'role': role}
-    expires = datetime.now(timezone.utc) + expires_delta
+    # jti identifica o token na lista de revogação; iat permite revogar todos os tokens
+    # de um usuário emitidos até um instante.
+    now = datetime.now(timezone.utc)
+    encode = {'sub': username, 'id': user_id, 'role': role, 'jti': uuid.uuid4().hex, 'iat': now}
+    expires = now + expires_delta
     encode.update({'exp': expires})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def hash_refresh_token(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+async def prune_refresh_tokens(db: AsyncSession, now: int):
+    """Apaga (na transação de quem chama) os refresh tokens expirados, então a tabela
+    só guarda os tokens ainda utilizáveis."""
+    await db.execute(delete(RefreshTokensModel).where(RefreshTokensModel.expires_at <= now)
+                     .execution_options(synchronize_session=False))
+
+
+def new_refresh_token(user_id: int) -> tuple[str, RefreshTokensModel]:
+    """Token opaco (devolvido ao cliente) e a linha a gravar, que guarda só o hash."""
+    refresh_token = secrets.token_urlsafe(32)
+    expires_at = int(time.time()) + REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+    return refresh_token, RefreshTokensModel(token_hash=hash_refresh_token(refresh_token), user_id=user_id,
+                                             expires_at=expires_at)
+
+
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    start = time.perf_counter()
+    try:
+        await revocation_list.sync()  # no máximo uma consulta a cada TOKEN_REVOCATION_SYNC_SECONDS
+        return _validate_token(token)[0]
+    finally:
+        metrics.record('auth_seconds', time.perf_counter() - start)
+
+
+async def is_token_valid(token: str) -> bool:
+    """O token ainda vale (não expirou nem foi revogado)? Para conexões longas, ver /todos/events."""
+    await revocation_list.sync()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        _validate_token(token)
+    except HTTPException:
+        return False
+    return True
+
+
+def _validate_token(token: str) -> tuple[dict, dict]:
+    """Usuário do token e as claims usadas na revogação (jti, iat, exp)."""
+    token_key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(token_key)
+    if cached is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user.')
         username: str = payload.get('sub')
         user_id: int = payload.get('id')
         user_role: str = payload.get('role')
         if username is None or user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user.')
-        return {'username': username, 'id': user_id, 'user_role': user_role}
-    except JWTError:
+        current_user = {'username': username, 'id': user_id, 'user_role': user_role}
+        claims = {'jti': payload.get('jti'), 'iat': payload.get('iat'), 'exp': payload.get('exp')}
+        cached = (current_user, claims)
+        token_cache.set(token_key, cached, expires_at=payload.get('exp'))
+
+    # Também para tokens já em cache: um logout ou exclusão vale imediatamente.
+    current_user, claims = cached
+    if revocation_list.is_revoked(claims['jti'], current_user['id'], claims['iat']):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user.')
+    return dict(current_user), claims
 
 
 class CreateUserRequest(BaseModel):
@@ -85,6 +154,15 @@ class CreateUserRequest(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: str | None = None
 
 
 
@@ -94,28 +172,89 @@ class Token(BaseModel):
 # create_user
 @router.post('/', status_code=status.HTTP_201_CREATED)
 async def create_user(db: db_dependency, create_user_request: CreateUserRequest):
+    hashed_password = await password_hasher.hash(create_user_request.password)
     create_user_model = UsersModel(
         username=create_user_request.username,
         email=create_user_request.email,
         first_name=create_user_request.first_name,
         last_name=create_user_request.last_name,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=hashed_password,
         role=create_user_request.role,
         is_active=True,
         phone_number=create_user_request.phone_number
     )
 
-    db.add(create_user_model)
-    db.commit()
+    async with write_lock():
+        db.add(create_user_model)
+        await db.commit()
 
 
 # login
 @router.post('/token', response_model=Token)
-async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency,
+                                 request: Request):
+    # Antes de qualquer consulta ou bcrypt: o excesso de tentativas é recusado com 429.
+    await login_rate_limiter.check(ip=request.client.host if request.client else 'unknown',
+                                   username=form_data.username.lower())
+
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user.')
     
-    token = create_access_token(user.username, user.id, user.role, timedelta(minutes=20))
+    token = create_access_token(user.username, user.id, user.role, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    refresh_token, refresh_token_model = new_refresh_token(user.id)
+
+    async with write_lock():
+        await prune_refresh_tokens(db, int(time.time()))
+        db.add(refresh_token_model)
+        await db.commit()
+
+    return {'access_token': token, 'token_type': 'bearer', 'refresh_token': refresh_token}
+
+
+# refresh
+@router.post('/refresh', response_model=Token)
+async def refresh_access_token(db: db_dependency, refresh_request: RefreshTokenRequest):
+    """Troca um refresh token válido por um novo access token (e um novo refresh token).
+
+    Não há verificação de senha: o custo é uma consulta e uma escrita, não um bcrypt.
+    O refresh token usado é apagado (rotação), então cada um vale uma única vez.
+    """
+    now = int(time.time())
+    async with write_lock():
+        # DELETE ... RETURNING: consome e lê o token em um único comando, de forma atômica,
+        # então duas requisições com o mesmo token não conseguem as duas renová-lo.
+        result = await db.execute(delete(RefreshTokensModel)
+                                  .where(RefreshTokensModel.token_hash == hash_refresh_token(refresh_request.refresh_token))
+                                  .where(RefreshTokensModel.expires_at > now)
+                                  .returning(RefreshTokensModel.user_id)
+                                  .execution_options(synchronize_session=False))
+        user_id = result.scalar()
+        user = await db.scalar(select(UsersModel).where(UsersModel.id == user_id)) if user_id is not None else None
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate user.')
+
+        await prune_refresh_tokens(db, now)
+        refresh_token, refresh_token_model = new_refresh_token(user.id)
+        db.add(refresh_token_model)
+        await db.commit()
+
+    token = create_access_token(user.username, user.id, user.role, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return {'access_token': token, 'token_type': 'bearer', 'refresh_token': refresh_token}
+
 
-    return {'access_token': token, 'token_type': 'bearer'}
+# logout
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(db: db_dependency, token: Annotated[str, Depends(oauth2_bearer)],
+                 logout_request: LogoutRequest | None = None):
+    """Revoga o access token usado na requisição e, se enviado, o refresh token."""
+    current_user, claims = _validate_token(token)
+    async with write_lock():
+        if claims['jti'] is not None:
+            await revocation_list.record(db, current_user['id'], claims['exp'], jti=claims['jti'])
+        if logout_request is not None and logout_request.refresh_token:
+            await db.execute(delete(RefreshTokensModel)
+                             .where(RefreshTokensModel.token_hash == hash_refresh_token(logout_request.refresh_token))
+                             .where(RefreshTokensModel.user_id == current_user['id'])
+                             .execution_options(synchronize_session=False))
+        await db.commit()
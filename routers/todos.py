@@ -1,25 +1,64 @@
-from typing import Annotated
+import base64
+import binascii
+import json
+import os
+import time
+from typing import Annotated, Literal
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from sqlalchemy import select, insert, update, delete, tuple_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, Body, Request
+from fastapi.responses import StreamingResponse
 from models import Todos as TodosModel
-from database import SessionLocal
-from .auth import get_current_user
+from database import write_lock
+from sharding import shard_router
+from cache import VersionedCache, backend_from_env, cached_json_response, to_json
+from search import search_statement, search_terms
+from events import EventHub, broker_from_env
+from .auth import get_current_user, is_token_valid, oauth2_bearer
 
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# As sessões são abertas no shard do usuário (ver sharding.py). Escritas (e leituras que
+# precedem uma escrita) vão para o primário do shard; as rotas só de leitura usam
+# get_read_db, que pode ir para uma réplica (ver replicas.py).
+async def get_db(user: user_dependency):
+    user_id = user.get('id') if user else None
+    async with shard_router.for_owner(user_id).write_session(user_id) as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(get_current_user)]
+async def get_read_db(user: user_dependency):
+    user_id = user.get('id') if user else None
+    async with shard_router.for_owner(user_id).read_session(user_id) as db:
+        yield db
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+
+# Cache das leituras de cada usuário (páginas da listagem e todos individuais), já
+# serializadas. As rotas de escrita deste módulo invalidam o cache do dono.
+# TODO_CACHE_BACKEND=memory (padrão, por processo) | redis (TODO_CACHE_URL) | none.
+# Com vários workers use redis: o backend em memória só é invalidado no próprio worker.
+todo_cache = VersionedCache(backend_from_env('TODO_CACHE'), 'todos', ttl=float(os.getenv('TODO_CACHE_TTL', 30)))
+
+# Eventos de mudança de cada usuário, para GET /todos/events (ver events.py).
+# TODO_EVENTS_BACKEND=memory (padrão, por processo) | redis (TODO_EVENTS_URL) | none.
+# Com vários workers use redis: no backend em memória o evento só chega às conexões do próprio worker.
+todo_events = EventHub(broker_from_env('TODO_EVENTS'), queue_size=int(os.getenv('TODO_EVENTS_QUEUE_SIZE', 100)))
+TODO_EVENTS_HEARTBEAT_SECONDS = float(os.getenv('TODO_EVENTS_HEARTBEAT_SECONDS', 15))
+
+
+async def todos_changed(owner_id: int, event_type: str, ids: list[int]):
+    """Depois do commit de uma escrita: invalida o cache do dono e avisa as conexões dele."""
+    await todo_cache.invalidate(owner_id)
+    await todo_events.publish(owner_id, event_type, ids=ids)
 
 
 
@@ -31,30 +70,258 @@ class TodoRequest(BaseModel):
     complete: bool
 
 
+# Pydantic para as respostas. As consultas de leitura selecionam exatamente estas
+# colunas (tuplas, sem instanciar o modelo ORM) e serializam direto com orjson.
+class TodoOut(BaseModel):
+    id: int
+    title: str | None
+    description: str | None
+    priority: int | None
+    complete: bool | None
+    owner_id: int | None
+
+
+class TodoPage(BaseModel):
+    items: list[TodoOut]
+    next_cursor: str | None
+
+
+TODO_COLUMNS = tuple(getattr(TodosModel, name) for name in TodoOut.model_fields)
+
+
+def parse_fields(fields: str | None, response_model: type[BaseModel]) -> tuple[str, ...]:
+    """Campos pedidos em ?fields=a,b (sparse fieldset), na ordem do modelo de resposta.
+
+    Sem `fields`, devolve todos os campos do modelo. Campo desconhecido -> 400.
+    """
+    names = tuple(response_model.model_fields)
+    if not fields:
+        return names
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - set(names)
+    if unknown or not requested:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown field(s): {', '.join(sorted(unknown))}." if unknown else 'Empty fields.')
+    return tuple(name for name in names if name in requested)
+
+
+# Operações em lote ---------------------------------------------------------
+# Cada lote é executado como uma única instrução (INSERT/UPDATE/DELETE) e um único commit.
+MAX_BULK_ITEMS = 500
+
+
+class TodoBulkUpdateRequest(TodoRequest):
+    id: int = Field(gt=0)
+
+
+class TodoBulkDeleteRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+
+# Paginação por cursor (keyset) -------------------------------------------
+# O cursor guarda a chave de ordenação do último item da página. A próxima página
+# começa com "WHERE (chave) > (cursor)" em vez de OFFSET, então o custo de cada
+# página é o mesmo, não importa o quão fundo o cliente esteja na lista.
+SORT_KEYS = {
+    'id': (TodosModel.id,),
+    'priority': (TodosModel.priority, TodosModel.id),
+}
+
+
+def encode_cursor(sort: str, todo_model) -> str:
+    key = [getattr(todo_model, column.key) for column in SORT_KEYS[sort]]
+    raw = json.dumps({'s': sort, 'k': key}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(sort: str, cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key = data['k']
+        valid = data['s'] == sort and isinstance(key, list) and len(key) == len(SORT_KEYS[sort]) \
+            and all(isinstance(value, int) for value in key)
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor.')
+    return key
+
+
+# Estatísticas --------------------------------------------------------------
+# Contagens agregadas no banco (GROUP BY owner_id, complete, priority), que o índice
+# ix_todos_owner_id_complete_priority responde sem ler a tabela.
+STATS_QUERY = select(TodosModel.owner_id, TodosModel.complete, TodosModel.priority, func.count()) \
+    .group_by(TodosModel.owner_id, TodosModel.complete, TodosModel.priority)
+
+
+def empty_stats() -> dict:
+    return {'total': 0, 'completed': 0, 'by_priority': {}}
+
+
+def add_to_stats(stats: dict, complete: bool, priority: int | None, count: int):
+    stats['total'] += count
+    if complete:
+        stats['completed'] += count
+    by_priority = stats['by_priority']
+    by_priority[str(priority)] = by_priority.get(str(priority), 0) + count
+
+
 # READ routers --------------------------------------------------------------
-@router.get('/', status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+@router.get('/', status_code=status.HTTP_200_OK, response_model=TodoPage)
+async def read_all(user: user_dependency, db: read_db_dependency, request: Request,
+                   limit: int = Query(50, gt=0, le=500),
+                   cursor: str | None = None,
+                   complete: bool | None = None,
+                   priority: int | None = Query(None, gt=0, lt=6),
+                   sort: Literal['id', 'priority'] = 'id',
+                   fields: str | None = Query(None, description='Comma-separated subset of TodoOut fields.')):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
+
+    sort_columns = SORT_KEYS[sort]
+    cursor_key = decode_cursor(sort, cursor) if cursor is not None else None
+    field_names = parse_fields(fields, TodoOut)
+    # As colunas da ordenação também são lidas (o cursor precisa delas), mas só os
+    # campos pedidos vão para a resposta.
+    columns = [getattr(TodosModel, name) for name in field_names]
+    columns += [column for column in sort_columns if column.key not in field_names]
+
+    async def load_page() -> bytes:
+        query = select(*columns).where(TodosModel.owner_id == user.get('id'))
+        if complete is not None:
+            query = query.where(TodosModel.complete == complete)
+        if priority is not None:
+            query = query.where(TodosModel.priority == priority)
+        if cursor_key is not None:
+            query = query.where(tuple_(*sort_columns) > tuple_(*cursor_key))
+
+        # Buscamos um item a mais para saber se existe uma próxima página.
+        result = await db.execute(query.order_by(*sort_columns).limit(limit + 1))
+        todos = result.all()
+
+        next_cursor = None
+        if len(todos) > limit:
+            todos = todos[:limit]
+            next_cursor = encode_cursor(sort, todos[-1])
+        items = [dict(zip(field_names, todo)) for todo in todos]
+        return to_json({'items': items, 'next_cursor': next_cursor})
+
+    return await cached_json_response(request, todo_cache, user.get('id'),
+                                      f"list:{sort}:{limit}:{complete}:{priority}:{cursor}:{','.join(field_names)}",
+                                      load_page)
+
+
+
+@router.get('/todos/search', status_code=status.HTTP_200_OK)
+async def search_todos(user: user_dependency, db: read_db_dependency, request: Request,
+                       q: str = Query(min_length=1, max_length=200),
+                       limit: int = Query(20, gt=0, le=100),
+                       offset: int = Query(0, ge=0, le=1000),
+                       fields: str | None = Query(None, description='Comma-separated subset of TodoOut fields.')):
+    """Busca no título e na descrição, do resultado mais para o menos relevante.
+
+    Cada palavra de `q` precisa aparecer (também como prefixo: "rep" encontra "report").
+    A paginação é por offset, já que a ordem é pela relevância e não por uma chave.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
+
+    terms = search_terms(q)
+    field_names = parse_fields(fields, TodoOut)
+
+    async def load_results() -> bytes:
+        if not terms:
+            return to_json({'items': [], 'next_offset': None})
+        statement = search_statement(db.bind.dialect.name, [getattr(TodosModel, name) for name in field_names],
+                                     user.get('id'), terms)
+        result = await db.execute(statement.limit(limit + 1).offset(offset))
+        todos = result.all()
+        next_offset = offset + limit if len(todos) > limit else None
+        return to_json({'items': [todo._asdict() for todo in todos[:limit]], 'next_offset': next_offset})
+
+    return await cached_json_response(request, todo_cache, user.get('id'),
+                                      f"search:{' '.join(terms)}:{limit}:{offset}:{','.join(field_names)}",
+                                      load_results)
+
+
+@router.get('/todos/stats', status_code=status.HTTP_200_OK)
+async def read_stats(user: user_dependency, db: read_db_dependency, request: Request):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
-    return db.query(TodosModel).filter(TodosModel.owner_id == user.get('id')).all()
 
+    async def load_stats() -> bytes:
+        stats = empty_stats()
+        result = await db.execute(STATS_QUERY.where(TodosModel.owner_id == user.get('id')))
+        for _, complete, priority, count in result:
+            add_to_stats(stats, complete, priority, count)
+        stats['by_priority'] = dict(sorted(stats['by_priority'].items()))
+        return to_json(stats)
+
+    # Em cache junto com as demais leituras do dono: repetir a consulta custa O(1)
+    # até a próxima escrita.
+    return await cached_json_response(request, todo_cache, user.get('id'), 'stats', load_stats)
 
 
-@router.get('/todo/{todo_id}', status_code=status.HTTP_200_OK)
-async def read_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+@router.get('/todo/{todo_id}', status_code=status.HTTP_200_OK, response_model=TodoOut)
+async def read_todo(user: user_dependency, db: read_db_dependency, request: Request, todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
     
-    todo_model = db.query(TodosModel).filter(TodosModel.id == todo_id)\
-        .filter(TodosModel.owner_id == user.get('id')).first()
-    if todo_model is not None:
-        return todo_model
+    async def load_todo() -> bytes | None:
+        result = await db.execute(select(*TODO_COLUMNS).where(TodosModel.id == todo_id)
+                                  .where(TodosModel.owner_id == user.get('id')))
+        todo = result.first()
+        return to_json(todo._asdict()) if todo is not None else None
+
+    response = await cached_json_response(request, todo_cache, user.get('id'), f'todo:{todo_id}', load_todo)
+    if response is not None:
+        return response
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found.')
 
 
 
 
 
+@router.get('/todos/events', status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def stream_events(user: user_dependency, token: Annotated[str, Depends(oauth2_bearer)]):
+    """Mudanças nos todos do usuário como Server-Sent Events, em vez de polling em GET /.
+
+    Eventos `created`, `updated` e `deleted` (data: {"type", "ids"}); `resync` quando a
+    conexão ficou para trás e eventos foram descartados (recarregue a lista); e
+    `user_deleted`, que encerra o stream. Comentários `: ping` mantêm a conexão viva, e
+    ela é encerrada quando o token expira ou é revogado.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
+    if not todo_events.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo events are disabled.')
+
+    async def stream():
+        async with todo_events.subscribe(user.get('id')) as subscription:
+            yield b'retry: 5000\n\n'
+            check_token_at = time.monotonic() + TODO_EVENTS_HEARTBEAT_SECONDS
+            while True:
+                event = await subscription.get(timeout=TODO_EVENTS_HEARTBEAT_SECONDS)
+                if time.monotonic() >= check_token_at:
+                    if not await is_token_valid(token):
+                        return
+                    check_token_at = time.monotonic() + TODO_EVENTS_HEARTBEAT_SECONDS
+                if event is None:
+                    yield b': ping\n\n'
+                    continue
+                event_type, frame = event
+                yield frame
+                if event_type == 'user_deleted':
+                    return
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+
+
+
 # CREATE routers ----------------------------------------------------------
 @router.post('/todo', status_code=status.HTTP_201_CREATED)
 async def create_todo(user: user_dependency ,db: db_dependency, todo_request: TodoRequest):
@@ -64,9 +331,37 @@ async def create_todo(user: user_dependency ,db: db_dependency, todo_request: To
     # Transformando a requisição (TodoRequest[ou schema...]) para
     # o formado do BANCO DE DADOS TodosModel
     todo_model = TodosModel(**todo_request.model_dump(), owner_id=user.get('id'))
+    # Com vários shards o id vem da sequência compartilhada (ver sharding.py).
+    todo_ids = await shard_router.allocate_todo_ids(1)
+    if todo_ids:
+        todo_model.id = todo_ids[0]
+
+    async with write_lock():
+        db.add(todo_model)
+        await db.commit()
+    await todos_changed(user.get('id'), 'created', [todo_model.id])
+
+
+# create_todos_bulk
+@router.post('/todos/bulk', status_code=status.HTTP_201_CREATED)
+async def create_todos_bulk(user: user_dependency, db: db_dependency,
+                            todo_requests: list[TodoRequest] = Body(min_length=1, max_length=MAX_BULK_ITEMS)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
+
+    rows = [{**todo_request.model_dump(), 'owner_id': user.get('id')} for todo_request in todo_requests]
+    allocated_ids = await shard_router.allocate_todo_ids(len(rows))
+    if allocated_ids:
+        for row, todo_id in zip(rows, allocated_ids):
+            row['id'] = todo_id
+    # sort_by_parameter_order garante que os ids retornados seguem a ordem da requisição
+    async with write_lock():
+        result = await db.scalars(insert(TodosModel).returning(TodosModel.id, sort_by_parameter_order=True), rows)
+        todo_ids = result.all()
+        await db.commit()
+    await todos_changed(user.get('id'), 'created', todo_ids)
 
-    db.add(todo_model)
-    db.commit()
+    return [{'id': todo_id, 'status': 'created'} for todo_id in todo_ids]
 
 
 
@@ -80,18 +375,43 @@ async def update_todo(user: user_dependency, db: db_dependency, todo_request: To
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
 
-    todo_model = db.query(TodosModel).filter(TodosModel.id == todo_id)\
-        .filter(TodosModel.owner_id == user.get('id')).first()
-    if todo_model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found.')
+    # Um único UPDATE ... RETURNING: se nenhuma linha voltar, o todo não existe (ou não é do usuário).
+    async with write_lock():
+        updated_id = await db.scalar(update(TodosModel)
+                                     .where(TodosModel.id == todo_id, TodosModel.owner_id == user.get('id'))
+                                     .values(**todo_request.model_dump())
+                                     .returning(TodosModel.id)
+                                     .execution_options(synchronize_session=False))
+        if updated_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found.')
 
-    todo_model.title = todo_request.title
-    todo_model.description = todo_request.description
-    todo_model.priority = todo_request.priority
-    todo_model.complete = todo_request.complete
+        await db.commit()
+    await todos_changed(user.get('id'), 'updated', [todo_id])
 
-    db.add(todo_model)
-    db.commit()
+
+# update_todos_bulk
+@router.put('/todos/bulk', status_code=status.HTTP_200_OK)
+async def update_todos_bulk(user: user_dependency, db: db_dependency,
+                            todo_requests: list[TodoBulkUpdateRequest] = Body(min_length=1, max_length=MAX_BULK_ITEMS)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
+
+    requested_ids = [todo_request.id for todo_request in todo_requests]
+    result = await db.scalars(select(TodosModel.id).where(TodosModel.id.in_(requested_ids))
+                              .where(TodosModel.owner_id == user.get('id')))
+    owned_ids = set(result.all())
+
+    rows = [todo_request.model_dump() for todo_request in todo_requests if todo_request.id in owned_ids]
+    if rows:
+        # UPDATE em lote pela chave primária (executemany), sem carregar os objetos.
+        async with write_lock():
+            await db.execute(update(TodosModel).where(TodosModel.owner_id == user.get('id'))
+                             .execution_options(synchronize_session=None), rows)
+            await db.commit()
+        await todos_changed(user.get('id'), 'updated', [row['id'] for row in rows])
+
+    return [{'id': todo_id, 'status': 'updated' if todo_id in owned_ids else 'not_found'}
+            for todo_id in requested_ids]
 
 
 
@@ -104,10 +424,32 @@ async def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = P
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
     
-    todo_model = db.query(TodosModel).filter(TodosModel.id == todo_id)\
-        .filter(TodosModel.owner_id == user.get('id')).first()
-    if todo_model is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found.')
+    async with write_lock():
+        deleted_id = await db.scalar(delete(TodosModel)
+                                     .where(TodosModel.id == todo_id, TodosModel.owner_id == user.get('id'))
+                                     .returning(TodosModel.id)
+                                     .execution_options(synchronize_session=False))
+        if deleted_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found.')
+
+        await db.commit()
+    await todos_changed(user.get('id'), 'deleted', [todo_id])
+
+
+# delete_todos_bulk
+@router.delete('/todos/bulk', status_code=status.HTTP_200_OK)
+async def delete_todos_bulk(user: user_dependency, db: db_dependency, delete_request: TodoBulkDeleteRequest):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed.')
 
-    db.query(TodosModel).filter(TodosModel.id == todo_id, TodosModel.owner_id == user.get('id')).delete()
-    db.commit()
\ No newline at end of file
+    async with write_lock():
+        result = await db.scalars(delete(TodosModel).where(TodosModel.id.in_(delete_request.ids))
+                                  .where(TodosModel.owner_id == user.get('id')).returning(TodosModel.id))
+        deleted_ids = set(result.all())
+        await db.commit()
+    if deleted_ids:
+        await todos_changed(user.get('id'), 'deleted',
+                            [todo_id for todo_id in delete_request.ids if todo_id in deleted_ids])
+
+    return [{'id': todo_id, 'status': 'deleted' if todo_id in deleted_ids else 'not_found'}
+            for todo_id in delete_request.ids]
\ No newline at end of file
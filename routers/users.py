@@ -1,14 +1,18 @@
+import os
 from typing import Annotated
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Request
 from models import Todos as TodosModel
 from models import Users as UsersModel
-from database import SessionLocal
+from database import write_lock
+from replicas import replica_router
+from cache import VersionedCache, backend_from_env, cached_json_response, to_json
 from .auth import get_current_user
 
-# Importação do CryptContext para a rota de atualização de senha
-from passlib.context import CryptContext
+# Serviço de hashing usado na rota de atualização de senha
+from hashing import password_hasher
 
 
 router = APIRouter(
@@ -17,18 +21,43 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# Escritas (e leituras que precedem uma escrita) vão para o primário; as rotas só de
+# leitura usam get_read_db, que pode ir para uma réplica (ver replicas.py).
+async def get_db(user: user_dependency):
+    async with replica_router.write_session(user.get('id') if user else None) as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto") 
+async def get_read_db(user: user_dependency):
+    async with replica_router.read_session(user.get('id') if user else None) as db:
+        yield db
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 
+# Cache (e ETag) do perfil de cada usuário, invalidado pelas rotas de atualização.
+# Mesmas opções do cache de todos: USER_CACHE_BACKEND, USER_CACHE_URL, USER_CACHE_TTL.
+user_cache = VersionedCache(backend_from_env('USER_CACHE'), 'users', ttl=float(os.getenv('USER_CACHE_TTL', 30)))
+
+
+
+# Resposta do perfil: nunca inclui o hashed_password.
+class UserOut(BaseModel):
+    id: int
+    email: str | None
+    username: str | None
+    first_name: str | None
+    last_name: str | None
+    is_active: bool | None
+    role: str | None
+    phone_number: str | None
+
+
+USER_COLUMNS = tuple(getattr(UsersModel, name) for name in UserOut.model_fields)
 
 
 class UserVerification(BaseModel):
@@ -41,11 +70,17 @@ class UserVerification(BaseModel):
 # READ routers --------------------------------------------------------------
 
 # read_user
-@router.get('/', status_code=status.HTTP_200_OK)
-async def read_user(user: user_dependency, db: db_dependency):
+@router.get('/', status_code=status.HTTP_200_OK, response_model=UserOut | None)
+async def read_user(user: user_dependency, db: read_db_dependency, request: Request):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed')
-    return db.query(UsersModel).filter(UsersModel.id == user.get('id')).first()
+
+    async def load_user() -> bytes:
+        result = await db.execute(select(*USER_COLUMNS).where(UsersModel.id == user.get('id')))
+        user_row = result.first()
+        return to_json(user_row._asdict() if user_row is not None else None)
+
+    return await cached_json_response(request, user_cache, user.get('id'), 'profile', load_user)
 
 
 
@@ -59,14 +94,16 @@ async def change_password(user: user_dependency, db: db_dependency, user_verific
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed')
      
     # Getting the model from the database to see if everything is ok:
-    user_model = db.query(UsersModel).filter(UsersModel.id == user.get('id')).first()
+    user_model = await db.scalar(select(UsersModel).where(UsersModel.id == user.get('id')))
 
-    if not bcrypt_context.verify(user_verification.password, user_model.hashed_password):
+    if not await password_hasher.verify(user_verification.password, user_model.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Error on password change')
-    user_model.hashed_password = bcrypt_context.hash(user_verification.new_password)
+    user_model.hashed_password = await password_hasher.hash(user_verification.new_password)
 
-    db.add(user_model)
-    db.commit()
+    async with write_lock():
+        db.add(user_model)
+        await db.commit()
+    await user_cache.invalidate(user.get('id'))
 
 
 
@@ -75,8 +112,10 @@ async def change_password(user: user_dependency, db: db_dependency, user_verific
 async def change_phone_number(user: user_dependency, db: db_dependency, phone_number: str):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed')
-    user_model = db.query(UsersModel).filter(UsersModel.id == user.get('id')).first()
+    user_model = await db.scalar(select(UsersModel).where(UsersModel.id == user.get('id')))
     user_model.phone_number = phone_number
 
-    db.add(user_model)
-    db.commit()
+    async with write_lock():
+        db.add(user_model)
+        await db.commit()
+    await user_cache.invalidate(user.get('id'))
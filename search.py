@@ -0,0 +1,102 @@
+# Busca textual nos todos (título + descrição).
+#
+# SQLite: tabela virtual FTS5 "todos_fts" com conteúdo externo (o texto continua só em
+# todos) mantida em sincronia por triggers de INSERT/UPDATE/DELETE, então as rotas de
+# escrita não precisam fazer nada. O owner_id também é indexado: a busca fica restrita
+# aos todos do dono dentro do próprio índice, sem ler os resultados dos outros usuários.
+# O ranking usa bm25() (com peso zero para a coluna owner_id).
+# PostgreSQL: índice GIN sobre to_tsvector(título || descrição); como é um índice de
+# expressão, o próprio banco o mantém atualizado. O ranking usa ts_rank().
+#
+# O índice é criado junto com o schema (create_all) e pela migração do Alembic.
+
+import re
+
+from sqlalchemy import column, event, func, literal_column, select, table, text
+
+from database import Base
+from models import Todos as TodosModel
+
+
+SEARCH_CONFIG = 'simple'
+POSTGRES_DOCUMENT = f"to_tsvector('{SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+    "title, description, owner_id, content='todos', content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+    "prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN "
+    "INSERT INTO todos_fts(rowid, title, description, owner_id) "
+    "VALUES (new.id, new.title, new.description, new.owner_id); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description, owner_id) "
+    "VALUES ('delete', old.id, old.title, old.description, old.owner_id); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE OF title, description, owner_id ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description, owner_id) "
+    "VALUES ('delete', old.id, old.title, old.description, old.owner_id); "
+    "INSERT INTO todos_fts(rowid, title, description, owner_id) "
+    "VALUES (new.id, new.title, new.description, new.owner_id); END",
+)
+SQLITE_DROP = (
+    'DROP TRIGGER IF EXISTS todos_fts_update',
+    'DROP TRIGGER IF EXISTS todos_fts_delete',
+    'DROP TRIGGER IF EXISTS todos_fts_insert',
+    'DROP TABLE IF EXISTS todos_fts',
+)
+
+# Tabela FTS5 para uso nas consultas (não faz parte do metadata: é criada pelo DDL acima).
+todos_fts = table('todos_fts', column('rowid'))
+
+POSTGRES_DDL = (f'CREATE INDEX IF NOT EXISTS ix_todos_search ON todos USING gin ({POSTGRES_DOCUMENT})',)
+POSTGRES_DROP = ('DROP INDEX IF EXISTS ix_todos_search',)
+
+
+def create_search_index(connection):
+    """Cria (se ainda não existir) o índice de busca no banco da conexão."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'")).first()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # indexa os todos que já estavam no banco
+            connection.execute(text("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def drop_search_index(connection):
+    dialect = connection.dialect.name
+    statements = SQLITE_DROP if dialect == 'sqlite' else POSTGRES_DROP if dialect == 'postgresql' else ()
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+def search_terms(query: str) -> list[str]:
+    """Palavras da busca, sem nenhum caractere de sintaxe do FTS5 / tsquery."""
+    return re.findall(r'\w+', query.lower())
+
+
+def search_statement(dialect: str, columns, owner_id: int, terms: list[str]):
+    """SELECT das `columns` dos todos do dono que contêm todos os termos (por prefixo),
+    do mais para o menos relevante."""
+    if dialect == 'postgresql':
+        document = literal_column(POSTGRES_DOCUMENT)
+        query = func.to_tsquery(SEARCH_CONFIG, ' & '.join(f'{term}:*' for term in terms))
+        return select(*columns).where(TodosModel.owner_id == owner_id) \
+            .where(document.op('@@')(query)) \
+            .order_by(func.ts_rank(document, query).desc(), TodosModel.id)
+
+    fts = literal_column('todos_fts')
+    match = f'owner_id:"{int(owner_id)}" AND {{title description}}: (' + ' '.join(f'"{term}"*' for term in terms) + ')'
+    return select(*columns).select_from(todos_fts) \
+        .join(TodosModel, TodosModel.id == todos_fts.c.rowid) \
+        .where(fts.op('MATCH')(match)) \
+        .where(TodosModel.owner_id == owner_id) \
+        .order_by(func.bm25(fts, 1.0, 1.0, 0.0), TodosModel.id)
@@ -0,0 +1,278 @@
+# Divisão dos todos em shards por dono (opcional).
+#
+# Toda consulta do router de todos é filtrada por owner_id, então os todos de um usuário
+# podem ficar inteiros em um único banco. TODO_SHARD_URLS (nome=url separados por
+# vírgula) liga a divisão: o dono é mapeado para um shard por hashing consistente sobre
+# os nomes, e as rotas de todos usam a sessão desse shard. Sem shards configurados há um
+# único shard, o banco principal (com as réplicas de replicas.py), e nada muda.
+#
+#   TODO_SHARD_URLS="a=postgresql://db-a/todos,b=postgresql://db-b/todos"
+#
+# Um shard cuja URL é a DATABASE_URL usa o banco principal e as suas réplicas. Os
+# usuários, tokens e a sequência de ids (id_blocks) ficam sempre no banco principal.
+#
+# Ids: com vários shards o id de cada todo é reservado na tabela id_blocks do banco
+# principal, em blocos (hi/lo), então é único entre todos os shards e um todo pode
+# mudar de shard sem mudar de id.
+#
+# Hashing consistente: ao acrescentar (ou remover) um shard só os donos dos trechos do
+# anel que mudaram de shard precisam ser movidos (~1/N deles), e não quase todos, como
+# aconteceria com owner_id % N. Para movê-los:
+#
+#   python -m sharding rebalance [--drain nome=url ...] [--dry-run]
+#
+# que percorre todos os shards (e os que estão saindo do anel, em --drain) e move os
+# todos de cada dono que não está no shard certo. Pode ser executado de novo sem efeito
+# colateral: rode depois de publicar a nova configuração e mais uma vez para levar as
+# escritas feitas no shard antigo durante a troca.
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import (ASYNC_SQLALCHEMY_DATABASE_URL, AsyncSessionLocal, SQLALCHEMY_DATABASE_URL, dispose_engines,
+                      to_async_url, write_lock)
+from models import IdBlocks, Todos as TodosModel
+from replicas import LazySessionmaker, ReplicaRouter, replica_router
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Anel de hashing consistente com `vnodes` pontos por nó."""
+
+    def __init__(self, nodes, vnodes: int = 128):
+        points = sorted((_hash(f'{node}#{index}'), node) for node in nodes for index in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key) -> str:
+        index = bisect.bisect(self._hashes, _hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+class IdAllocator:
+    """Ids únicos entre os shards, reservados em blocos de `block_size` no banco principal.
+
+    Cada worker reserva um bloco com um único UPDATE ... RETURNING e distribui os ids
+    dele em memória; a ordem dos ids entre workers diferentes não segue a da criação.
+    """
+
+    def __init__(self, session_factory, name: str, block_size: int = 1000, initial_value=None):
+        self.session_factory = session_factory
+        self.name = name
+        self.block_size = block_size
+        self.initial_value = initial_value  # corrotina: primeiro id da sequência, se ela ainda não existe
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+        self.blocks = 0
+
+    async def allocate(self, count: int) -> list[int]:
+        async with self._lock:
+            ids = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    await self._reserve(max(self.block_size, count - len(ids)))
+                taken = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + taken))
+                self._next += taken
+            return ids
+
+    async def _reserve(self, size: int):
+        while True:
+            async with self.session_factory() as db:
+                async with write_lock():
+                    end = await db.scalar(update(IdBlocks).where(IdBlocks.name == self.name)
+                                          .values(next_value=IdBlocks.next_value + size)
+                                          .returning(IdBlocks.next_value)
+                                          .execution_options(synchronize_session=False))
+                    if end is None:
+                        start = await self.initial_value() if self.initial_value is not None else 1
+                        end = start + size
+                        db.add(IdBlocks(name=self.name, next_value=end))
+                    try:
+                        await db.commit()
+                    except IntegrityError:
+                        # outro worker criou a sequência ao mesmo tempo: reserva de novo
+                        continue
+            self._next, self._end = end - size, end
+            self.blocks += 1
+            return
+
+    def reset(self):
+        self._next = self._end = 0
+
+
+class ShardRouter:
+    """Escolhe o shard (um ReplicaRouter) dos todos de cada dono."""
+
+    def __init__(self, shards: dict[str, ReplicaRouter], id_session_factory=AsyncSessionLocal,
+                 vnodes: int = 128, id_block_size: int = 1000):
+        self.shards = dict(shards)
+        self.ring = HashRing(self.shards, vnodes)
+        self.todo_ids = IdAllocator(id_session_factory, 'todos', id_block_size, initial_value=self.next_todo_id)
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def shard_name(self, owner_id) -> str:
+        if not self.sharded:
+            return next(iter(self.shards))
+        return self.ring.node_for(owner_id)
+
+    def for_owner(self, owner_id) -> ReplicaRouter:
+        return self.shards[self.shard_name(owner_id)]
+
+    async def allocate_todo_ids(self, count: int) -> list[int] | None:
+        """Ids para `count` novos todos; None com um único shard (o banco gera os ids)."""
+        if not self.sharded:
+            return None
+        return await self.todo_ids.allocate(count)
+
+    async def gather(self, function) -> list:
+        """Executa `function(shard)` em todos os shards ao mesmo tempo, na ordem dos shards."""
+        return await asyncio.gather(*(function(shard) for shard in self.shards.values()))
+
+    async def next_todo_id(self) -> int:
+        async def max_id(shard):
+            async with shard.primary() as db:
+                return await db.scalar(select(func.max(TodosModel.id))) or 0
+        return max(await self.gather(max_id)) + 1
+
+    def stats(self) -> dict:
+        return {'shards': len(self.shards), 'id_blocks_reserved': self.todo_ids.blocks}
+
+
+def parse_shard_urls(value: str) -> dict[str, str]:
+    shards = {}
+    for item in value.split(','):
+        if item.strip():
+            name, separator, url = item.partition('=')
+            if not separator or not name.strip() or not url.strip():
+                raise ValueError(f'Invalid shard {item.strip()!r}: expected name=url')
+            shards[name.strip()] = url.strip()
+    return shards
+
+
+def shard_urls() -> dict[str, str]:
+    return parse_shard_urls(os.getenv('TODO_SHARD_URLS', ''))
+
+
+def shard_for_url(url: str) -> ReplicaRouter:
+    if url == SQLALCHEMY_DATABASE_URL or to_async_url(url) == ASYNC_SQLALCHEMY_DATABASE_URL:
+        return replica_router
+    return ReplicaRouter(LazySessionmaker(url))
+
+
+shard_router = ShardRouter({name: shard_for_url(url) for name, url in shard_urls().items()}
+                           or {'default': replica_router},
+                           id_block_size=int(os.getenv('TODO_ID_BLOCK_SIZE', 1000)))
+
+
+def _shard_sessionmakers(router: ShardRouter) -> list[LazySessionmaker]:
+    return [shard.primary for shard in router.shards.values() if isinstance(shard.primary, LazySessionmaker)]
+
+
+def get_shard_engines() -> list:
+    """Engines dos shards que não são o banco principal, criados no primeiro uso."""
+    return [sessionmaker.get_engine() for sessionmaker in _shard_sessionmakers(shard_router)]
+
+
+async def dispose_shard_engines():
+    for sessionmaker in _shard_sessionmakers(shard_router):
+        await sessionmaker.dispose()
+
+
+# Rebalanceamento -----------------------------------------------------------
+
+async def move_owner(owner_id: int, source, target, batch_size: int = 500, dry_run: bool = False) -> int:
+    """Move os todos do dono do shard `source` para o `target` (sessionmakers), em lotes.
+
+    Cada lote é gravado no destino antes de ser apagado da origem: se o processo parar
+    no meio, os ids do lote que já estão no destino são substituídos na próxima execução.
+    """
+    table = TodosModel.__table__
+    moved = 0
+    while True:
+        async with source() as source_db:
+            rows = (await source_db.execute(select(table).where(table.c.owner_id == owner_id)
+                                            .order_by(table.c.id).limit(batch_size))).mappings().all()
+            if not rows:
+                return moved
+            if dry_run:
+                return await source_db.scalar(select(func.count()).where(table.c.owner_id == owner_id))
+            ids = [row['id'] for row in rows]
+            async with target() as target_db:
+                async with write_lock():
+                    await target_db.execute(delete(table).where(table.c.id.in_(ids)))
+                    await target_db.execute(insert(table), [dict(row) for row in rows])
+                    await target_db.commit()
+            async with write_lock():
+                await source_db.execute(delete(table).where(table.c.id.in_(ids)))
+                await source_db.commit()
+        moved += len(rows)
+
+
+async def rebalance(router: ShardRouter, drain: dict | None = None, batch_size: int = 500,
+                    dry_run: bool = False) -> dict:
+    """Leva os todos de cada dono para o shard dele no anel de `router`.
+
+    `drain` (nome -> sessionmaker) são shards que saíram do anel: todos os seus todos
+    são movidos. Devolve quantos donos e todos foram (ou, com dry_run, seriam) movidos.
+    """
+    sources = {name: shard.primary for name, shard in router.shards.items()}
+    sources.update(drain or {})
+    report = {'owners': 0, 'todos': 0, 'by_shard': {}}
+    for name, source in sources.items():
+        async with source() as db:
+            owner_ids = (await db.scalars(select(TodosModel.owner_id).distinct()
+                                          .where(TodosModel.owner_id.is_not(None)))).all()
+        for owner_id in owner_ids:
+            target_name = router.shard_name(owner_id)
+            if target_name == name:
+                continue
+            moved = await move_owner(owner_id, source, router.shards[target_name].primary, batch_size, dry_run)
+            report['owners'] += 1
+            report['todos'] += moved
+            route = f'{name}->{target_name}'
+            report['by_shard'][route] = report['by_shard'].get(route, 0) + moved
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m sharding', description='Todo shard maintenance.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebalance_parser = commands.add_parser(
+        'rebalance', help='move each owner\'s todos to their shard in TODO_SHARD_URLS')
+    rebalance_parser.add_argument('--drain', action='append', default=[], metavar='NAME=URL',
+                                  help='a shard being removed from the ring (repeatable)')
+    rebalance_parser.add_argument('--batch-size', type=int, default=500)
+    rebalance_parser.add_argument('--dry-run', action='store_true', help='only count what would be moved')
+    args = parser.parse_args()
+
+    drain = {name: LazySessionmaker(url) for name, url in parse_shard_urls(','.join(args.drain)).items()}
+
+    async def run():
+        try:
+            return await rebalance(shard_router, drain, args.batch_size, args.dry_run)
+        finally:
+            await dispose_shard_engines()
+            await dispose_engines()
+            for sessionmaker in drain.values():
+                await sessionmaker.dispose()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == '__main__':
+    main()
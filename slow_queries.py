@@ -0,0 +1,127 @@
+# Registro de consultas lentas.
+#
+# Todo comando SQL que passar de SLOW_QUERY_THRESHOLD_MS é guardado (com parâmetros,
+# rota de origem e o plano de execução) em um buffer circular de tamanho fixo, que
+# os administradores consultam em GET /admin/slow-queries. Assim índices que faltam
+# aparecem a partir dos dados reais de produção.
+
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from metrics import current_route
+
+
+logger = logging.getLogger('slow_queries')
+
+# Tamanho máximo de cada parâmetro guardado no registro.
+MAX_PARAMETER_LENGTH = 200
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def _truncate(parameters):
+    if isinstance(parameters, dict):
+        return {key: _truncate(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_truncate(value) for value in parameters]
+    if isinstance(parameters, str) and len(parameters) > MAX_PARAMETER_LENGTH:
+        return parameters[:MAX_PARAMETER_LENGTH] + '...'
+    return parameters
+
+
+class SlowQueryLog:
+    """Buffer circular com os comandos SQL mais lentos que `threshold_ms`.
+
+    Com `explain`, o plano é capturado na mesma conexão logo após o comando lento:
+    EXPLAIN QUERY PLAN no SQLite e EXPLAIN no PostgreSQL. `analyze` usa EXPLAIN ANALYZE
+    no PostgreSQL (executa a consulta de novo, por isso só é aplicado a SELECTs).
+    """
+
+    def __init__(self, threshold_ms: float = 200, maxlen: int = 100, explain: bool = True, analyze: bool = False):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.analyze = analyze
+        self.entries: deque = deque(maxlen=maxlen)
+
+    def install(self, engine):
+        sync_engine = getattr(engine, 'sync_engine', engine)
+
+        @event.listens_for(sync_engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('slow_query_start_time', []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed_ms = (time.perf_counter() - conn.info['slow_query_start_time'].pop()) * 1000
+            if elapsed_ms >= self.threshold_ms:
+                self.record(conn, statement, parameters, executemany, elapsed_ms)
+
+    def record(self, conn, statement, parameters, executemany, elapsed_ms):
+        entry = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed_ms, 3),
+            'route': current_route(),
+            'statement': statement,
+            'parameters': _truncate(parameters),
+            'plan': None,
+        }
+        if self.explain and not executemany:
+            entry['plan'] = self._explain(conn, statement, parameters)
+        self.entries.append(entry)
+        logger.warning('Slow query (%.1f ms) on %s: %s', elapsed_ms, entry['route'], statement)
+
+    def _explain(self, conn, statement, parameters):
+        dialect = conn.dialect.name
+        if dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif dialect == 'postgresql':
+            is_select = statement.lstrip().upper().startswith('SELECT')
+            prefix = 'EXPLAIN ANALYZE ' if self.analyze and is_select else 'EXPLAIN '
+        else:
+            return None
+
+        # Cursor do DBAPI diretamente: não dispara os eventos do engine de novo.
+        # No PostgreSQL um erro aborta a transação aberta da requisição; o EXPLAIN roda
+        # em um savepoint, desfeito em caso de erro, para que ela continue utilizável.
+        savepoint = dialect == 'postgresql' and conn.in_transaction()
+        cursor = conn.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(prefix + statement, parameters)
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+            except Exception as error:  # o plano é só diagnóstico; nunca derruba a requisição
+                if savepoint:
+                    cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                plan = [f'EXPLAIN failed: {error}']
+            if savepoint:
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return plan
+        except Exception as error:
+            return [f'EXPLAIN failed: {error}']
+        finally:
+            cursor.close()
+
+    def snapshot(self) -> list:
+        """Entradas da mais recente para a mais antiga."""
+        return list(reversed(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200)),
+    maxlen=int(os.getenv('SLOW_QUERY_LOG_SIZE', 100)),
+    explain=_env_bool('SLOW_QUERY_EXPLAIN', True),
+    analyze=_env_bool('SLOW_QUERY_EXPLAIN_ANALYZE', False),
+)
@@ -3,11 +3,17 @@
 
     Always make sure to import all the dependencies and functions needed for the tests to run.
 """
+import json
 from .utils import *
-from routers.admin import get_db, get_current_user # OVERRIDE this functions to use the test database and a fake user
+from routers.admin import get_db, get_read_db, get_todo_shards, get_current_user # OVERRIDE this functions to use the test database and a fake user
 from models import Todos as TodosModel # Import the TodosModel to create a test todo
+from slow_queries import slow_query_log
+from revocation import revocation_list
+import time
 
 app.dependency_overrides[get_db] = override_get_db # Override the get_db function to use the test database
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_todo_shards] = override_get_todo_shards
 app.dependency_overrides[get_current_user] = override_get_current_user # Override the get_current_user function to use a fake user
 
 
@@ -20,6 +26,52 @@ def test_admin_read_all_authenticated(test_todo):
                                 "priority": 3, 
                                 "complete": False, 
                                 "owner_id": 1}]
+
+
+def test_admin_read_all_ndjson(test_todo):
+    response = client.get("/admin/todo", params={"format": "ndjson"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"id": 1,
+                                                                          "title": "Test Todo",
+                                                                          "description": "Test Description",
+                                                                          "priority": 3,
+                                                                          "complete": False,
+                                                                          "owner_id": 1}]
+
+
+def test_admin_read_all_users_hides_password(test_user):
+    response = client.get("/admin/users")
+    assert response.status_code == status.HTTP_200_OK
+    assert [user['username'] for user in response.json()] == ['test_user']
+    assert 'hashed_password' not in response.json()[0]
+
+
+def test_admin_read_all_sparse_fields(test_todo):
+    response = client.get("/admin/todo", params={"fields": "id,owner_id"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"id": 1, "owner_id": 1}]
+
+    response = client.get("/admin/users", params={"fields": "hashed_password"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_admin_read_stats(test_todo):
+    db = TestingSessionLocal()
+    db.add(TodosModel(title='Foreign Todo', description='Other user', priority=1, complete=True, owner_id=2))
+    db.commit()
+
+    response = client.get("/admin/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {'total': 2, 'completed': 1, 'by_priority': {'1': 1, '3': 1},
+                               'by_owner': {'1': {'total': 1, 'completed': 0, 'by_priority': {'3': 1}},
+                                            '2': {'total': 1, 'completed': 1, 'by_priority': {'1': 1}}}}
+
+
+def test_admin_read_all_empty():
+    response = client.get("/admin/todo")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
     
 
 def test_admin_delete_todo(test_todo):
@@ -35,3 +87,31 @@ def test_admin_delete_todo_not_found(test_todo):
     response = client.delete("/admin/todo/999")
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json() == {'detail': 'Todo not found.'}
+
+
+def test_admin_delete_user(test_user):
+    response = client.delete("/admin/user/1")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    db = TestingSessionLocal()
+    assert db.query(UserModel).filter(UserModel.id == 1).first() is None
+    # os tokens já emitidos para o usuário excluído deixam de valer
+    assert revocation_list.is_revoked('any-jti', 1, int(time.time()) - 60)
+    assert not revocation_list.is_revoked('any-jti', 2, int(time.time()) - 60)
+
+
+def test_admin_delete_user_not_found(test_user):
+    response = client.delete("/admin/user/999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {'detail': 'User not found.'}
+
+
+def test_admin_read_slow_queries():
+    slow_query_log.clear()
+    slow_query_log.entries.append({'statement': 'SELECT * FROM todos', 'duration_ms': 512.0,
+                                   'route': 'GET /admin/todo', 'parameters': [], 'plan': ['SCAN todos']})
+
+    response = client.get("/admin/slow-queries")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['queries'][0]['plan'] == ['SCAN todos']
+    slow_query_log.clear()
@@ -1,25 +1,27 @@
 from .utils import *
-from routers.auth import get_db, get_current_user, authenticate_user, create_access_token, SECRET_KEY, ALGORITHM
+from routers.auth import get_db, get_current_user, authenticate_user, create_access_token, token_cache, SECRET_KEY, ALGORITHM
 from jose import jwt
 from datetime import timedelta
 import pytest
 from fastapi import HTTPException
+from unittest.mock import patch
+from revocation import BloomFilter, RevocationList, revocation_list
 
 app.dependency_overrides[get_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
 
-def test_authenticate_user(test_user):
-    db = TestingSessionLocal()
-
-    authenticated_user = authenticate_user('test_user', 'testpassword', db)
-    assert authenticated_user is not None
-    assert authenticated_user.username == test_user.username
+@pytest.mark.asyncio
+async def test_authenticate_user(test_user):
+    async with TestingAsyncSessionLocal() as db:
+        authenticated_user = await authenticate_user('test_user', 'testpassword', db)
+        assert authenticated_user is not None
+        assert authenticated_user.username == test_user.username
 
-    non_existent_user = authenticate_user('non_existent_user', 'testpassword', db)
-    assert non_existent_user is None
+        non_existent_user = await authenticate_user('non_existent_user', 'testpassword', db)
+        assert non_existent_user is None
 
-    wrong_password_user = authenticate_user(test_user.username, 'wrongpassword', db)
-    assert wrong_password_user is None
+        wrong_password_user = await authenticate_user(test_user.username, 'wrongpassword', db)
+        assert wrong_password_user is None
 
 
 def test_create_access_token(test_user):
@@ -56,4 +58,106 @@ async def test_get_current_user_missing_payload():
         await get_current_user(token=token)
     
     assert excinfo.value.status_code == 401
-    assert excinfo.value.detail == 'Could not validate user.'
\ No newline at end of file
+    assert excinfo.value.detail == 'Could not validate user.'
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_uses_token_cache():
+    token = create_access_token('test_user', 1, 'user', timedelta(minutes=20))
+    hits = token_cache.hits
+
+    first = await get_current_user(token)
+    second = await get_current_user(token)
+
+    assert first == second == {'username': 'test_user', 'id': 1, 'user_role': 'user'}
+    assert token_cache.hits == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_expired_token_not_cached():
+    token = create_access_token('test_user', 1, 'user', timedelta(minutes=-1))
+
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_user(token)
+    assert excinfo.value.status_code == 401
+
+
+def test_login_returns_refresh_token_and_refresh_rotates_it(test_user):
+    response = client.post('/auth/token', data={'username': 'test_user', 'password': 'testpassword'})
+    assert response.status_code == status.HTTP_200_OK
+    refresh_token = response.json()['refresh_token']
+
+    with patch('routers.auth.password_hasher.verify') as verify:
+        response = client.post('/auth/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == status.HTTP_200_OK
+    verify.assert_not_called()  # sem bcrypt
+    payload = jwt.decode(response.json()['access_token'], SECRET_KEY, algorithms=[ALGORITHM])
+    assert payload['sub'] == 'test_user' and payload['jti']
+    assert response.json()['refresh_token'] != refresh_token
+
+    # o refresh token antigo foi consumido na rotação
+    response = client.post('/auth/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert client.post('/auth/refresh', json={'refresh_token': 'unknown'}).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_refresh_tokens_table_stays_bounded(test_user):
+    def count_refresh_tokens():
+        with engine.connect() as connection:
+            return connection.execute(text('SELECT count(*) FROM refresh_tokens')).scalar()
+
+    with engine.begin() as connection:  # um token já expirado, de um login antigo
+        connection.execute(text("INSERT INTO refresh_tokens (token_hash, user_id, expires_at) "
+                                "VALUES ('expired', 1, 1)"))
+    refresh_token = client.post('/auth/token', data={'username': 'test_user', 'password': 'testpassword'}
+                                ).json()['refresh_token']
+    assert count_refresh_tokens() == 1  # o expirado foi apagado no login
+
+    for _ in range(5):
+        response = client.post('/auth/refresh', json={'refresh_token': refresh_token}).json()
+        refresh_token = response['refresh_token']
+    assert count_refresh_tokens() == 1  # cada rotação troca a linha em vez de acumular
+
+    client.post('/auth/logout', json={'refresh_token': refresh_token},
+                headers={'Authorization': f"Bearer {response['access_token']}"})
+    assert count_refresh_tokens() == 0
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_cached_access_token_and_refresh_token(test_user):
+    response = client.post('/auth/token', data={'username': 'test_user', 'password': 'testpassword'})
+    access_token, refresh_token = response.json()['access_token'], response.json()['refresh_token']
+    assert (await get_current_user(access_token))['username'] == 'test_user'  # agora em cache
+
+    response = client.post('/auth/logout', json={'refresh_token': refresh_token},
+                           headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_user(access_token)
+    assert excinfo.value.status_code == 401
+    assert client.post('/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_revocations_are_synced_from_the_database(test_user):
+    token = create_access_token('test_user', 1, 'user', timedelta(minutes=20))
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    async with TestingAsyncSessionLocal() as db:
+        # simula o logout feito por outro worker: grava sem aplicar na lista deste processo
+        other_worker = RevocationList(session_factory=TestingAsyncSessionLocal)
+        await other_worker.record(db, 1, claims['exp'], jti=claims['jti'])
+        await db.commit()
+
+    assert not revocation_list.is_revoked(claims['jti'], 1, claims['iat'])
+    await revocation_list.sync(force=True)
+    assert revocation_list.is_revoked(claims['jti'], 1, claims['iat'])
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f'jti-{i}')
+    assert all(f'jti-{i}' in bloom for i in range(1000))
+    false_positives = sum(f'other-{i}' in bloom for i in range(10_000))
+    assert false_positives < 300
@@ -0,0 +1,102 @@
+import time
+import pytest
+from unittest.mock import patch
+from starlette.requests import Request
+from cache import LRUCache, MemoryBackend, RedisBackend, VersionedCache, cached_json_response
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'a' passa a ser o mais recente
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_items_expire():
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.set('expired', 1, expires_at=time.time() - 1)
+    cache.set('valid', 2)
+
+    assert cache.get('expired') is None
+    assert cache.get('valid') == 2
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+class FakeRedis:
+    """Implementa só os comandos usados pelo RedisBackend."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend_factory', [MemoryBackend, lambda: RedisBackend(FakeRedis())])
+async def test_versioned_cache_read_through_and_invalidation(backend_factory):
+    cache = VersionedCache(backend_factory(), 'todos', ttl=30)
+    calls = []
+
+    async def producer():
+        calls.append(1)
+        return f'page {len(calls)}'.encode()
+
+    assert await cache.get_or_set(1, 'list', producer) == b'page 1'
+    assert await cache.get_or_set(1, 'list', producer) == b'page 1'
+    assert await cache.get_or_set(2, 'list', producer) == b'page 2'  # outro dono, outra entrada
+
+    await cache.invalidate(1)
+    assert await cache.get_or_set(1, 'list', producer) == b'page 3'
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'invalidations': 1, 'hit_rate': 0.25}
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_always_calls_producer():
+    cache = VersionedCache(None, 'todos')
+
+    async def producer():
+        return b'fresh'
+
+    assert await cache.get_or_set(1, 'list', producer) == b'fresh'
+    await cache.invalidate(1)
+
+
+@pytest.mark.asyncio
+async def test_stale_version_of_another_worker_expires_with_the_ttl():
+    # dois workers com o backend em memória: a escrita só troca a versão de um deles
+    worker, writer = VersionedCache(MemoryBackend(), 'todos', ttl=30), VersionedCache(MemoryBackend(), 'todos', ttl=30)
+
+    async def producer():
+        return b'[]'
+
+    response = await cached_json_response(Request({'type': 'http', 'headers': []}), worker, 1, 'list', producer)
+    etag = response.headers['etag']
+    await writer.invalidate(1)
+
+    def conditional_request():
+        return Request({'type': 'http', 'headers': [(b'if-none-match', etag.encode())]})
+
+    assert (await cached_json_response(conditional_request(), worker, 1, 'list', producer)).status_code == 304
+    # passado o TTL o worker não confirma mais o ETag antigo
+    with patch('time.time', return_value=time.time() + 31):
+        response = await cached_json_response(conditional_request(), worker, 1, 'list', producer)
+    assert response.status_code == 200 and response.headers['etag'] != etag
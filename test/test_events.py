@@ -0,0 +1,173 @@
+"""
+    Change events for a user's todos: the in-process fan-out, the brokers and GET /todos/events.
+"""
+import asyncio
+import httpx
+import pytest
+from .utils import *
+from events import EventHub, MemoryBroker, RedisBroker, Subscription
+from routers import todos
+from routers.todos import get_db, get_current_user, todo_events
+from routers.auth import create_access_token
+from datetime import timedelta
+
+
+class FakeRedis:
+    """Pub/sub em memória: implementa só o que o RedisBroker usa."""
+
+    def __init__(self):
+        self.pubsubs = []
+
+    def pubsub(self):
+        pubsub = FakePubSub()
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    async def publish(self, channel, data):
+        for pubsub in self.pubsubs:
+            if channel in pubsub.channels:
+                pubsub.messages.put_nowait({'type': 'message', 'channel': channel.encode(), 'data': data})
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels = set()
+        self.messages = asyncio.Queue()
+
+    @property
+    def subscribed(self):
+        return bool(self.channels)
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_replaced_by_a_resync():
+    subscription = Subscription(maxsize=2)
+    for index in range(3):
+        subscription.put(('created', f'{index}'.encode()))
+
+    assert await subscription.get(timeout=0) == ('resync', b'event: resync\ndata: {"type":"resync"}\n\n')
+    assert await subscription.get(timeout=0) is None
+    assert subscription.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_events_reach_only_the_owner_connections():
+    hub = EventHub(MemoryBroker(), queue_size=10)
+    async with hub.subscribe(1) as first, hub.subscribe(1) as second, hub.subscribe(2) as other:
+        await hub.publish(1, 'created', ids=[5])
+        expected = ('created', b'event: created\ndata: {"type":"created","ids":[5]}\n\n')
+        assert await first.get(timeout=0) == expected
+        assert await second.get(timeout=0) == expected
+        assert await other.get(timeout=0) is None
+        assert hub.stats() == {'connections': 3, 'published': 1, 'delivered': 2, 'overflows': 0,
+                                 'publish_errors': 0}
+    assert hub.subscriptions == {}
+
+
+@pytest.mark.asyncio
+async def test_redis_broker_shares_events_between_workers():
+    redis = FakeRedis()
+    publisher, worker = EventHub(RedisBroker(redis)), EventHub(RedisBroker(redis))
+    try:
+        async with worker.subscribe(7) as subscription:
+            # o worker só assina os canais dos usuários com conexões abertas nele
+            assert redis.pubsubs[0].channels == {'todo_events:7'}
+            await publisher.publish(7, 'deleted', ids=[1, 2])
+            assert await subscription.get(timeout=1) == (
+                'deleted', b'event: deleted\ndata: {"type":"deleted","ids":[1,2]}\n\n')
+        assert redis.pubsubs[0].channels == set()
+    finally:
+        await worker.stop()
+        await publisher.stop()
+
+
+class FailingBroker(MemoryBroker):
+    async def publish(self, user_id, payload):
+        raise ConnectionError('broker unavailable')
+
+
+@pytest.mark.asyncio
+async def test_failed_publish_is_logged_and_not_raised(caplog):
+    hub = EventHub(FailingBroker())
+    await hub.publish(1, 'created', ids=[1])
+    assert hub.stats()['published'] == 0 and hub.stats()['publish_errors'] == 1
+    assert 'Failed to publish created event for user 1' in caplog.text
+
+
+def test_disabled_events():
+    hub = EventHub(None)
+    assert not hub.enabled
+    asyncio.run(hub.publish(1, 'created', ids=[1]))
+    assert hub.stats()['published'] == 0
+
+
+@pytest.fixture
+def events_client():
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    token = create_access_token('test_user', 1, 'admin', timedelta(minutes=5))
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test',
+                            headers={'Authorization': f'Bearer {token}'})
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(overrides)
+
+
+async def wait_for_connection(user_id):
+    while not todo_events.subscriptions.get(user_id):
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_stream_receives_the_user_writes(test_todo, events_client):
+    async with events_client as client:
+        stream = asyncio.create_task(client.get('/todos/events'))
+        await asyncio.wait_for(wait_for_connection(1), timeout=5)
+
+        response = await client.put('/todo/1', json={'title': 'Changed', 'description': 'Changed description',
+                                                     'priority': 2, 'complete': True})
+        assert response.status_code == 204
+        assert (await client.delete('/todo/1')).status_code == 204
+        await todo_events.publish(1, 'user_deleted')  # encerra o stream
+
+        response = await asyncio.wait_for(stream, timeout=5)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert response.text == ('retry: 5000\n\n'
+                             'event: updated\ndata: {"type":"updated","ids":[1]}\n\n'
+                             'event: deleted\ndata: {"type":"deleted","ids":[1]}\n\n'
+                             'event: user_deleted\ndata: {"type":"user_deleted"}\n\n')
+    assert todo_events.subscriptions == {}
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_when_the_token_is_no_longer_valid(events_client, monkeypatch):
+    monkeypatch.setattr(todos, 'TODO_EVENTS_HEARTBEAT_SECONDS', 0.05)
+    events_client.headers['Authorization'] = 'Bearer invalid'
+    async with events_client as client:
+        response = await asyncio.wait_for(client.get('/todos/events'), timeout=5)
+    assert response.text == 'retry: 5000\n\n'
+
+
+@pytest.mark.asyncio
+async def test_write_succeeds_when_the_broker_fails(test_todo, events_client, monkeypatch):
+    # o evento é publicado depois do commit: a falha do broker não pode virar um 500
+    monkeypatch.setattr(todo_events, 'broker', FailingBroker())
+    async with events_client as client:
+        assert (await client.delete('/todo/1')).status_code == 204
+        assert (await client.get('/todo/1')).status_code == 404
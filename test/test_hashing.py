@@ -0,0 +1,32 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from hashing import PasswordHasher
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    hashed = await hasher.hash('testpassword')
+
+    assert await hasher.verify('testpassword', hashed) is True
+    assert await hasher.verify('wrongpassword', hashed) is False
+
+    stats = hasher.stats()
+    assert stats['calls'] == 3
+    assert stats['hash_seconds_total'] > 0
+    assert stats['in_flight'] == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+
+    results = await asyncio.gather(hasher.hash('first'), hasher.hash('second'), return_exceptions=True)
+
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == 503
+    assert hasher.stats()['rejected'] == 1
+    hasher.shutdown()
@@ -9,4 +9,22 @@ client = TestClient(main.app)
 def test_return_health_check():
     response = client.get('/healthy')
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == {'status': 'Healthy'}
\ No newline at end of file
+    assert response.json() == {'status': 'Healthy'}
+
+def test_metrics_endpoint():
+    client.get('/healthy')
+
+    response = client.get('/metrics')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'http_requests_total{method="GET",route="/healthy",status="200"}' in response.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/healthy",status="200",le="+Inf"}' in response.text
+    assert 'db_pool_checkouts' in response.text
+    assert 'password_hasher_calls' in response.text
+
+
+def test_create_app_runs_lifespan_without_touching_the_database():
+    checkouts = main.pool_status()['checkouts']
+    with TestClient(main.create_app()) as app_client:
+        assert app_client.get('/healthy').status_code == status.HTTP_200_OK
+    assert main.pool_status()['checkouts'] == checkouts  # nenhuma conexão aberta no startup
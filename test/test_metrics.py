@@ -0,0 +1,61 @@
+import asyncio
+from sqlalchemy import text
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from metrics import MetricsMiddleware, instrument_engine, route_metrics, record
+from .utils import async_engine
+
+
+# Aplicação mínima para testar o middleware isoladamente
+metrics_app = FastAPI()
+metrics_app.add_middleware(MetricsMiddleware, server_timing=True)
+instrument_engine(async_engine)
+
+
+@metrics_app.get('/items/{item_id}')
+async def read_item(item_id: int):
+    record('auth_seconds', 0.001)
+    async with async_engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
+        await connection.execute(text('SELECT 2'))
+    return {'item_id': item_id}
+
+
+@metrics_app.get('/events')
+async def events():
+    async def stream():
+        yield b'retry: 5000\n\n'
+        await asyncio.sleep(0.5)  # conexão aberta bem mais que a latência da rota
+        yield b': ping\n\n'
+    return StreamingResponse(stream(), media_type='text/event-stream')
+
+
+def test_middleware_records_route_db_and_auth_time():
+    route_metrics.reset()
+    response = TestClient(metrics_app).get('/items/1')
+
+    assert response.status_code == 200
+    assert 'desc="2 queries"' in response.headers['server-timing']
+
+    metrics = route_metrics.routes[('GET', '/items/{item_id}', '200')]
+    assert metrics['count'] == 1
+    assert metrics['db_statements'] == 2
+    assert metrics['db_seconds'] > 0
+    assert metrics['auth_seconds'] == 0.001
+
+
+def test_unmatched_route():
+    route_metrics.reset()
+    TestClient(metrics_app).get('/does-not-exist')
+    assert ('GET', 'unmatched', '404') in route_metrics.routes
+
+
+def test_event_stream_duration_stops_at_the_response_start():
+    route_metrics.reset()
+    response = TestClient(metrics_app).get('/events')
+    assert response.text == 'retry: 5000\n\n: ping\n\n'
+
+    metrics = route_metrics.routes[('GET', '/events', '200')]
+    assert metrics['count'] == 1
+    assert metrics['duration_seconds'] < 0.5
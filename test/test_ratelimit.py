@@ -0,0 +1,70 @@
+from .utils import *
+from unittest.mock import patch
+from routers.auth import get_db
+from ratelimit import MemoryRateLimitBackend, RateLimiter, RedisRateLimitBackend, login_rate_limiter
+from fastapi import HTTPException
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_token_bucket():
+    backend = MemoryRateLimitBackend()
+    with patch('time.time', return_value=1000.0):
+        assert [await backend.hit([('ip:1', 3, 60)]) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert await backend.hit([('ip:1', 3, 60)]) == pytest.approx(20.0)  # um token a cada 20 s
+        assert await backend.hit([('ip:2', 3, 60)]) == 0.0  # outra chave, outro balde
+    with patch('time.time', return_value=1020.0):
+        assert await backend.hit([('ip:1', 3, 60)]) == 0.0
+        assert await backend.hit([('ip:1', 3, 60)]) > 0
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_expires_idle_keys():
+    backend = MemoryRateLimitBackend()
+    with patch('time.time', return_value=1000.0):
+        await backend.hit([('username:a', 5, 60)])
+    with patch('time.time', return_value=1013.0):
+        assert backend.lru.get('username:a') is None  # balde cheio de novo: a chave some
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_raises_429_with_retry_after():
+    limiter = RateLimiter(MemoryRateLimitBackend(), {'ip': (10, 60), 'username': (1, 60)})
+    await limiter.check(ip='1.2.3.4', username='bob')
+    with pytest.raises(HTTPException) as error:
+        await limiter.check(ip='1.2.3.4', username='bob')
+    assert error.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert error.value.headers == {'Retry-After': '60'}
+    await limiter.check(ip='1.2.3.4', username='alice')
+    assert limiter.stats() == {'allowed': 2, 'rejected': 1, 'keys': 3}
+
+
+@pytest.mark.asyncio
+async def test_rejected_attempt_does_not_consume_the_other_limits():
+    limiter = RateLimiter(MemoryRateLimitBackend(), {'ip': (2, 60), 'username': (1, 60)})
+    with patch('time.time', return_value=1000.0):
+        await limiter.check(ip='1.2.3.4', username='bob')
+        with pytest.raises(HTTPException):
+            await limiter.check(ip='1.2.3.4', username='bob')  # recusada pelo username
+        await limiter.check(ip='1.2.3.4', username='alice')  # o IP ainda tem um token
+        with pytest.raises(HTTPException):
+            await limiter.check(ip='1.2.3.4', username='carol')
+
+
+def test_clear_keeps_shared_redis_state():
+    limiter = RateLimiter(RedisRateLimitBackend(client=None), {'ip': (1, 60)})
+    limiter.clear()  # o backend Redis não tem estado local
+
+
+def test_login_is_rate_limited_before_the_database(test_user):
+    limit, _ = login_rate_limiter.limits['username']
+    for _ in range(limit):
+        response = client.post('/auth/token', data={'username': 'test_user', 'password': 'wrong'})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    with patch('routers.auth.authenticate_user') as authenticate_user:
+        response = client.post('/auth/token', data={'username': 'Test_User', 'password': 'testpassword'})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 'Retry-After' in response.headers
+    authenticate_user.assert_not_called()
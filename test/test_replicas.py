@@ -0,0 +1,73 @@
+"""
+    Read-replica routing, with two SQLite files standing in for the primary and the replica.
+"""
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from cache import MemoryBackend
+from models import Base, Todos as TodosModel
+from replicas import ReplicaRouter
+
+
+@pytest.fixture
+def router(tmp_path):
+    sessionmakers = {}
+    for name in ('primary', 'replica'):
+        path = tmp_path / f'{name}.db'
+        engine = create_engine(f'sqlite:///{path}')
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:  # o título diz de qual banco a linha veio
+            connection.execute(insert(TodosModel).values(title=name, description='', priority=1, complete=False,
+                                                         owner_id=1))
+        engine.dispose()
+        sessionmakers[name] = async_sessionmaker(bind=create_async_engine(f'sqlite+aiosqlite:///{path}',
+                                                                          poolclass=NullPool),
+                                                 class_=AsyncSession, expire_on_commit=False)
+    return ReplicaRouter(sessionmakers['primary'], [sessionmakers['replica']], pin_backend=MemoryBackend(),
+                         pin_seconds=5)
+
+
+async def read_titles(router, user_id):
+    async with router.read_session(user_id) as db:
+        return (await db.scalars(select(TodosModel.title).order_by(TodosModel.id))).all()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_the_replica(router):
+    assert await read_titles(router, 1) == ['replica']
+    # uma sessão de escrita sem escritas não fixa o usuário no primário
+    async with router.write_session(1) as db:
+        assert (await db.scalars(select(TodosModel.title))).all() == ['primary']
+    assert await read_titles(router, 1) == ['replica']
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes_pins_the_writer_to_the_primary(router):
+    async with router.write_session(1) as db:
+        db.add(TodosModel(title='new', description='', priority=1, complete=False, owner_id=1))
+        await db.commit()
+
+    assert await read_titles(router, 1) == ['primary', 'new']
+    assert await read_titles(router, 2) == ['replica']  # os outros usuários continuam na réplica
+    assert router.stats() == {'replicas': 1, 'reads_primary': 0, 'reads_replica': 1, 'reads_pinned': 1}
+
+    # terminada a janela de read-your-writes, o usuário volta para a réplica
+    with patch('time.time', return_value=2_000_000_000):
+        assert await read_titles(router, 1) == ['replica']
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_writes_do_not_pin(router):
+    async with router.write_session(1) as db:
+        await db.execute(insert(TodosModel).values(title='discarded', description='', priority=1, complete=False,
+                                                   owner_id=1))
+        await db.rollback()
+    assert await read_titles(router, 1) == ['replica']
+
+
+@pytest.mark.asyncio
+async def test_without_replicas_everything_uses_the_primary(router):
+    router = ReplicaRouter(router.primary)
+    assert await read_titles(router, 1) == ['primary']
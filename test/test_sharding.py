@@ -0,0 +1,191 @@
+"""
+    Todo sharding by owner, with SQLite files standing in for the main database and the shards.
+"""
+import pytest
+from collections import Counter
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from .utils import app, client, override_get_current_user
+from cache import MemoryBackend
+from models import Base, Todos as TodosModel
+from replicas import ReplicaRouter
+from routers import todos
+from routers.admin import get_current_user, get_todo_shards
+from sharding import HashRing, IdAllocator, ShardRouter, parse_shard_urls, rebalance
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """Banco principal (sequência de ids) e os shards 'a' e 'b': nome -> (engine síncrono, sessionmaker)."""
+    databases = {}
+    for name in ('main', 'a', 'b'):
+        path = tmp_path / f'{name}.db'
+        engine = create_engine(f'sqlite:///{path}')
+        Base.metadata.create_all(bind=engine)
+        databases[name] = (engine, async_sessionmaker(bind=create_async_engine(f'sqlite+aiosqlite:///{path}',
+                                                                               poolclass=NullPool),
+                                                      class_=AsyncSession, expire_on_commit=False))
+    yield databases
+    for engine, _ in databases.values():
+        engine.dispose()
+
+
+def make_router(databases, names=('a', 'b'), id_block_size=10):
+    return ShardRouter({name: ReplicaRouter(databases[name][1]) for name in names},
+                       id_session_factory=databases['main'][1], id_block_size=id_block_size)
+
+
+def add_todos(engine, owner_id, count, first_id=None):
+    with engine.begin() as connection:
+        for index in range(count):
+            values = {'title': f'todo {owner_id}', 'description': '', 'priority': 1, 'complete': False,
+                      'owner_id': owner_id}
+            if first_id is not None:
+                values['id'] = first_id + index
+            connection.execute(insert(TodosModel).values(**values))
+
+
+def owners_by_shard(databases, names=('a', 'b')):
+    result = {}
+    for name in names:
+        with databases[name][0].connect() as connection:
+            result[name] = dict(connection.execute(select(TodosModel.owner_id, func.count())
+                                                   .group_by(TodosModel.owner_id)).all())
+    return result
+
+
+def test_ring_spreads_owners_and_moves_few_when_a_shard_is_added():
+    two, three = HashRing(['a', 'b']), HashRing(['a', 'b', 'c'])
+    owners = range(1, 3001)
+
+    assert min(Counter(two.node_for(owner) for owner in owners).values()) > 1200
+    moved = [owner for owner in owners if two.node_for(owner) != three.node_for(owner)]
+    # só os donos que passaram para o novo shard mudam de lugar (~1/3 deles)
+    assert {three.node_for(owner) for owner in moved} == {'c'}
+    assert 700 < len(moved) < 1300
+
+
+def test_single_shard_uses_the_database_ids(databases):
+    router = make_router(databases, names=('a',))
+    assert not router.sharded
+    assert router.shard_name(123) == 'a'
+
+
+@pytest.mark.asyncio
+async def test_ids_are_unique_across_shards_and_workers(databases):
+    # a sequência começa depois dos todos que já existem em qualquer shard
+    add_todos(databases['b'][0], owner_id=1, count=1, first_id=41)
+    router = make_router(databases)
+
+    assert await router.allocate_todo_ids(5) == list(range(42, 47))
+    assert await router.allocate_todo_ids(30) == list(range(47, 77))  # resto do bloco + um bloco de 25
+    assert router.todo_ids.blocks == 2
+
+    other_worker = IdAllocator(databases['main'][1], 'todos', block_size=10)
+    assert await other_worker.allocate(5) == list(range(77, 82))
+    assert await router.allocate_todo_ids(5) == list(range(87, 92))
+
+
+def test_parse_shard_urls():
+    assert parse_shard_urls('a=sqlite:///./a.db, b=postgresql://h/db?sslmode=require') == {
+        'a': 'sqlite:///./a.db', 'b': 'postgresql://h/db?sslmode=require'}
+    with pytest.raises(ValueError):
+        parse_shard_urls('sqlite:///./a.db')
+
+
+@pytest.mark.asyncio
+async def test_rebalance_moves_owners_to_their_new_shard(databases):
+    for owner_id in range(1, 21):  # antes havia um único shard, 'a'
+        add_todos(databases['a'][0], owner_id, count=3, first_id=owner_id * 10)
+    router = make_router(databases)
+    expected = {name: {owner_id: 3 for owner_id in range(1, 21) if router.shard_name(owner_id) == name}
+                for name in ('a', 'b')}
+
+    report = await rebalance(router, dry_run=True)
+    assert report['todos'] == 3 * len(expected['b'])
+    assert owners_by_shard(databases)['b'] == {}
+
+    report = await rebalance(router, batch_size=2)
+    assert report['owners'] == len(expected['b']) and report['by_shard'] == {'a->b': 3 * len(expected['b'])}
+    assert owners_by_shard(databases) == expected
+    # ids preservados, e uma segunda execução não tem o que mover
+    with databases['b'][0].connect() as connection:
+        assert sorted(connection.scalars(select(TodosModel.id))) == sorted(
+            owner_id * 10 + index for owner_id in expected['b'] for index in range(3))
+    assert (await rebalance(router))['owners'] == 0
+
+
+@pytest.mark.asyncio
+async def test_rebalance_drains_a_removed_shard(databases):
+    add_todos(databases['b'][0], owner_id=7, count=2)
+    router = make_router(databases, names=('a',))
+
+    report = await rebalance(router, drain={'b': databases['b'][1]})
+    assert report['by_shard'] == {'b->a': 2}
+    assert owners_by_shard(databases) == {'a': {7: 2}, 'b': {}}
+
+
+@pytest.fixture
+def sharded_admin(databases):
+    router = make_router(databases)
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_todo_shards] = lambda: list(router.shards.values())
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    yield router
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(overrides)
+
+
+def test_admin_routes_merge_all_shards(databases, sharded_admin):
+    add_todos(databases['a'][0], owner_id=1, count=2, first_id=1)
+    add_todos(databases['b'][0], owner_id=2, count=1, first_id=3)
+
+    response = client.get('/admin/todo', params={'fields': 'id,owner_id'})
+    assert sorted(response.json(), key=lambda todo: todo['id']) == [
+        {'id': 1, 'owner_id': 1}, {'id': 2, 'owner_id': 1}, {'id': 3, 'owner_id': 2}]
+
+    stats = client.get('/admin/stats').json()
+    assert stats['total'] == 3 and {owner: value['total'] for owner, value in stats['by_owner'].items()} == {
+        '1': 2, '2': 1}
+
+    assert client.delete('/admin/todo/3').status_code == 204
+    assert owners_by_shard(databases) == {'a': {1: 2}, 'b': {}}
+    assert client.delete('/admin/todo/3').status_code == 404
+
+
+def test_admin_reads_after_a_delete_are_pinned_to_the_primary(databases):
+    # 'a' é o primário e 'b' uma réplica com atraso, que ainda tem o todo apagado
+    for name in ('a', 'b'):
+        add_todos(databases[name][0], owner_id=2, count=1, first_id=1)
+    shard = ReplicaRouter(databases['a'][1], [databases['b'][1]], pin_backend=MemoryBackend(), pin_seconds=5)
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_todo_shards] = lambda: [shard]
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    try:
+        assert client.delete('/admin/todo/1').status_code == 204
+        assert client.get('/admin/todo').json() == []
+        assert client.get('/admin/stats').json()['total'] == 0
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
+
+
+def test_owner_reads_after_an_admin_delete_are_pinned_to_the_primary(databases, monkeypatch):
+    # o admin (id 1) apaga um todo do usuário 2; a réplica 'b' ainda tem o todo
+    for name in ('a', 'b'):
+        add_todos(databases[name][0], owner_id=2, count=1, first_id=1)
+    shard = ReplicaRouter(databases['a'][1], [databases['b'][1]], pin_backend=MemoryBackend(), pin_seconds=5)
+    monkeypatch.setattr(todos, 'shard_router', ShardRouter({'a': shard}, id_session_factory=databases['main'][1]))
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides.pop(todos.get_read_db, None)
+    app.dependency_overrides[get_todo_shards] = lambda: [shard]
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    try:
+        assert client.delete('/admin/todo/1').status_code == 204
+        app.dependency_overrides[get_current_user] = lambda: {'username': 'owner', 'id': 2, 'user_role': 'user'}
+        assert client.get('/').json()['items'] == []
+        assert client.get('/todo/1').status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
@@ -0,0 +1,66 @@
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from slow_queries import SlowQueryLog
+
+
+@pytest.mark.asyncio
+async def test_records_slow_queries_with_plan(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+    log = SlowQueryLog(threshold_ms=0, maxlen=2)
+    log.install(engine)
+
+    async with engine.begin() as connection:
+        await connection.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, owner_id INTEGER)'))
+        log.clear()
+        await connection.execute(text('SELECT * FROM items WHERE owner_id = :owner_id'), {'owner_id': 1})
+
+    entry = log.snapshot()[0]
+    assert entry['statement'] == 'SELECT * FROM items WHERE owner_id = ?'
+    assert entry['parameters'] == [1]
+    assert entry['route'] is None
+    assert any('SCAN items' in line for line in entry['plan'])
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_is_bounded(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+    log = SlowQueryLog(threshold_ms=0, maxlen=2, explain=False)
+    log.install(engine)
+
+    async with engine.connect() as connection:
+        for number in range(5):
+            await connection.execute(text(f'SELECT {number}'))
+
+    assert [entry['statement'] for entry in log.snapshot()] == ['SELECT 4', 'SELECT 3']
+    await engine.dispose()
+
+
+class FakeCursor:
+    """Cursor do DBAPI que falha no EXPLAIN e registra os comandos."""
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement)
+        if statement.startswith('EXPLAIN'):
+            raise RuntimeError('syntax error')
+
+    def close(self):
+        pass
+
+
+def test_failed_explain_is_rolled_back_to_a_savepoint_on_postgresql():
+    executed = []
+    conn = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), in_transaction=lambda: True,
+                           connection=SimpleNamespace(cursor=lambda: FakeCursor(executed)))
+
+    plan = SlowQueryLog()._explain(conn, 'SELECT 1', ())
+
+    assert plan == ['EXPLAIN failed: syntax error']
+    # a transação da requisição continua utilizável depois do erro
+    assert executed == ['SAVEPOINT slow_query_explain', 'EXPLAIN SELECT 1',
+                        'ROLLBACK TO SAVEPOINT slow_query_explain', 'RELEASE SAVEPOINT slow_query_explain']
@@ -1,10 +1,11 @@
-from routers.todos import get_db, get_current_user
+from routers.todos import get_db, get_read_db, get_current_user
 from fastapi import status
 from .utils import *
 
 
 # Substituímos as dependências originais da API por versões "mockadas" para testes
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
 
 
@@ -14,14 +15,116 @@ def test_read_all_authenticated(test_todo):
     response = client.get('/')  # Faz uma requisição GET na raiz da API
 
     assert response.status_code == status.HTTP_200_OK  # Verifica se o status retornado é 200 (OK)
-    assert response.json() == [{
+    assert response.json() == {'items': [{
         'complete': False, 
         'title': 'Test Todo', 
         'description': 'Test Description', 
         'id': 1, 
         'priority': 3, 
         'owner_id': 1
-    }]
+    }], 'next_cursor': None}
+
+
+def test_read_all_paginated(test_todo):
+    db = TestingSessionLocal()
+    for priority in (1, 5, 1, 4):
+        db.add(TodosModel(title='Other Todo', description='Other Description',
+                          priority=priority, complete=priority == 4, owner_id=1))
+    db.add(TodosModel(title='Foreign Todo', description='Other user', priority=1, complete=False, owner_id=2))
+    db.commit()
+
+    # Percorre todas as páginas ordenadas por (priority, id)
+    ids, cursor = [], None
+    while True:
+        params = {'limit': 2, 'sort': 'priority'}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/', params=params)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page['items']) <= 2
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert ids == [2, 4, 1, 5, 3]
+
+    response = client.get('/', params={'complete': True})
+    assert [item['id'] for item in response.json()['items']] == [5]
+
+    response = client.get('/', params={'priority': 1, 'limit': 1})
+    assert [item['id'] for item in response.json()['items']] == [2]
+    assert response.json()['next_cursor'] is not None
+
+
+def test_read_all_invalid_cursor(test_todo):
+    response = client.get('/', params={'cursor': 'not-a-cursor'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+
+def test_read_all_sparse_fields(test_todo):
+    db = TestingSessionLocal()
+    db.add(TodosModel(title='Other Todo', description='Other Description', priority=1, complete=False, owner_id=1))
+    db.commit()
+
+    response = client.get('/', params={'fields': 'title,complete', 'sort': 'priority', 'limit': 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['items'] == [{'title': 'Other Todo', 'complete': False}]
+    # o cursor continua funcionando mesmo sem as colunas da ordenação na resposta
+    response = client.get('/', params={'fields': 'title,complete', 'sort': 'priority', 'limit': 1,
+                                       'cursor': response.json()['next_cursor']})
+    assert response.json() == {'items': [{'title': 'Test Todo', 'complete': False}], 'next_cursor': None}
+
+
+def test_read_all_unknown_field(test_todo):
+    response = client.get('/', params={'fields': 'title,secret'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {'detail': 'Unknown field(s): secret.'}
+
+
+def test_search_todos(test_todo):
+    db = TestingSessionLocal()
+    db.add(TodosModel(title='Write report', description='Quarterly report for finance', priority=2,
+                      complete=False, owner_id=1))
+    db.add(TodosModel(title='Buy milk', description='Groceries, not a report', priority=1, complete=False, owner_id=1))
+    db.add(TodosModel(title='Report', description='Someone else', priority=1, complete=False, owner_id=2))
+    db.commit()
+
+    response = client.get('/todos/search', params={'q': 'report'})
+    assert response.status_code == status.HTTP_200_OK
+    # o que cita "report" mais vezes vem primeiro; o todo do outro usuário não aparece
+    assert [item['id'] for item in response.json()['items']] == [2, 3]
+
+    response = client.get('/todos/search', params={'q': 'quart fin', 'fields': 'title'})
+    assert response.json() == {'items': [{'title': 'Write report'}], 'next_offset': None}
+
+    response = client.get('/todos/search', params={'q': 'report', 'limit': 1})
+    assert response.json()['next_offset'] == 1
+
+    # os triggers mantêm o índice em sincronia com as rotas de escrita
+    client.put('/todo/2', json={'title': 'Write memo', 'description': 'For finance',
+                                'priority': 2, 'complete': False})
+    assert [item['id'] for item in client.get('/todos/search', params={'q': 'report'}).json()['items']] == [3]
+    client.delete('/todo/3')
+    assert client.get('/todos/search', params={'q': 'report'}).json()['items'] == []
+
+    # caracteres de sintaxe do FTS5 são ignorados
+    assert client.get('/todos/search', params={'q': '"*'}).json() == {'items': [], 'next_offset': None}
+
+
+def test_read_stats(test_todo):
+    db = TestingSessionLocal()
+    db.add(TodosModel(title='Done Todo', description='Done', priority=5, complete=True, owner_id=1))
+    db.add(TodosModel(title='Foreign Todo', description='Other user', priority=1, complete=False, owner_id=2))
+    db.commit()
+
+    response = client.get('/todos/stats')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {'total': 2, 'completed': 1, 'by_priority': {'3': 1, '5': 1}}
+
+    client.delete('/todo/1')
+    assert client.get('/todos/stats').json() == {'total': 1, 'completed': 1, 'by_priority': {'5': 1}}
 
 
 def test_read_one_authenticated(test_todo):
@@ -105,4 +208,96 @@ def test_delete_todo(test_todo):
 def test_delete_todo_not_found():
     response = client.delete('/todo/999')  # Faz uma requisição DELETE na rota '/todo'
     assert response.status_code == status.HTTP_404_NOT_FOUND  # Verifica se o status retornado é 404 (NOT FOUND)
-    assert response.json() == {'detail': 'Todo not found.'}  # Verifica se a mensagem de erro é a esperada
\ No newline at end of file
+    assert response.json() == {'detail': 'Todo not found.'}  # Verifica se a mensagem de erro é a esperada
+
+
+def test_create_todos_bulk(test_todo):
+    request_data = [
+        {'title': 'Bulk Todo 1', 'description': 'First bulk todo', 'priority': 1, 'complete': False},
+        {'title': 'Bulk Todo 2', 'description': 'Second bulk todo', 'priority': 2, 'complete': True},
+    ]
+
+    response = client.post('/todos/bulk', json=request_data)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == [{'id': 2, 'status': 'created'}, {'id': 3, 'status': 'created'}]
+
+    db = TestingSessionLocal()
+    model = db.query(TodosModel).filter(TodosModel.id == 3).first()
+    assert model.title == 'Bulk Todo 2'
+    assert model.owner_id == 1
+
+
+def test_create_todos_bulk_empty():
+    response = client.post('/todos/bulk', json=[])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_update_todos_bulk(test_todo):
+    db = TestingSessionLocal()
+    db.add(TodosModel(title='Foreign Todo', description='Other user', priority=1, complete=False, owner_id=2))
+    db.commit()
+
+    request_data = [
+        {'id': 1, 'title': 'Updated Todo', 'description': 'Updated todo description', 'priority': 1, 'complete': True},
+        {'id': 2, 'title': 'Not mine', 'description': 'Should not change', 'priority': 1, 'complete': True},
+    ]
+
+    response = client.put('/todos/bulk', json=request_data)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{'id': 1, 'status': 'updated'}, {'id': 2, 'status': 'not_found'}]
+
+    db = TestingSessionLocal()
+    assert db.query(TodosModel).filter(TodosModel.id == 1).first().title == 'Updated Todo'
+    assert db.query(TodosModel).filter(TodosModel.id == 2).first().title == 'Foreign Todo'
+
+
+def test_delete_todos_bulk(test_todo):
+    response = client.request('DELETE', '/todos/bulk', json={'ids': [1, 999]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{'id': 1, 'status': 'deleted'}, {'id': 999, 'status': 'not_found'}]
+
+    db = TestingSessionLocal()
+    assert db.query(TodosModel).filter(TodosModel.id == 1).first() is None
+
+
+def test_read_all_is_cached_until_a_write(test_todo):
+    assert len(client.get('/').json()['items']) == 1
+    hits = todo_cache.hits
+
+    # Alteração feita por fora da API: a página em cache continua sendo servida
+    db = TestingSessionLocal()
+    db.add(TodosModel(title='Direct Todo', description='Inserted directly', priority=1, complete=False, owner_id=1))
+    db.commit()
+    assert len(client.get('/').json()['items']) == 1
+    assert todo_cache.hits == hits + 1
+
+    # Uma escrita pela API invalida o cache do usuário
+    client.put('/todo/1', json={'title': 'Updated Todo', 'description': 'Updated todo description',
+                                'priority': 1, 'complete': True})
+    response = client.get('/')
+    assert len(response.json()['items']) == 2
+    assert response.json()['items'][0]['title'] == 'Updated Todo'
+    assert client.get('/todo/1').json()['title'] == 'Updated Todo'
+
+
+def test_read_all_conditional_get(test_todo):
+    response = client.get('/')
+    etag = response.headers['etag']
+
+    not_modified = client.get('/', headers={'If-None-Match': etag})
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not_modified.content == b''
+
+    # Outra página (outros parâmetros) tem outro ETag
+    assert client.get('/', params={'limit': 10}).headers['etag'] != etag
+
+    client.delete('/todo/1')
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['etag'] != etag
+    assert response.json()['items'] == []
+
+
+def test_if_none_match_any_only_matches_an_existing_todo(test_todo):
+    assert client.get('/todo/1', headers={'If-None-Match': '*'}).status_code == status.HTTP_304_NOT_MODIFIED
+    assert client.get('/todo/999', headers={'If-None-Match': '*'}).status_code == status.HTTP_404_NOT_FOUND
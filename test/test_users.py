@@ -1,8 +1,9 @@
 from .utils import *
-from routers.users import get_db, get_current_user
+from routers.users import get_db, get_read_db, get_current_user
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
 
 def test_return_user(test_user):
@@ -14,6 +15,7 @@ def test_return_user(test_user):
     assert response.json()['last_name'] == 'User'
     assert response.json()['role'] == 'admin'
     assert response.json()['phone_number'] == '(99) 99999-9999'
+    assert 'hashed_password' not in response.json()
 
 
 def test_change_password_success(test_user):
@@ -29,4 +31,13 @@ def test_change_password_invalid_current_password(test_user):
 
 def test_change_phone_number_success(test_user):
     response = client.put("/user/phonenumber/(99) 11111-9999")
-    assert response.status_code == status.HTTP_204_NO_CONTENT
\ No newline at end of file
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+def test_return_user_conditional_get(test_user):
+    etag = client.get("/user").headers['etag']
+    assert client.get("/user", headers={'If-None-Match': etag}).status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.put("/user/phonenumber/(99) 22222-9999")
+    response = client.get("/user", headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['phone_number'] == '(99) 22222-9999'
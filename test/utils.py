@@ -1,7 +1,8 @@
 # Importações necessárias do SQLAlchemy para criar e gerenciar a conexão com o banco de dados
 from sqlalchemy import create_engine, text
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, NullPool
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 # Importações do projeto (Base para os modelos do banco, app para a aplicação FastAPI e dependências de autenticação)
 from database import Base
@@ -13,11 +14,17 @@ import pytest
 from models import Todos as TodosModel
 from models import Users as UserModel
 from fastapi import status
-from routers.auth import bcrypt_context
+from hashing import bcrypt_context
+from routers.todos import todo_cache
+from routers.users import user_cache
+from ratelimit import login_rate_limiter
+from revocation import revocation_list
+from replicas import ReplicaRouter
 
 
 # Configuração do banco de dados para testes
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 # Criação do mecanismo de banco de dados SQLite para testes
 # Usamos `StaticPool` para evitar problemas de concorrência em testes
@@ -26,17 +33,29 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread
 # Criamos uma sessão de banco de dados específica para testes
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrona apontando para o mesmo arquivo, usada pelas rotas durante os testes.
+# Usamos `NullPool` porque o TestClient e o pytest-asyncio rodam em event loops diferentes,
+# então cada sessão abre (e fecha) a sua própria conexão.
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Criamos as tabelas no banco de testes com base nos modelos definidos na aplicação
 Base.metadata.create_all(bind=engine)
 
 
+# A lista de revogação sincroniza pelo banco de testes.
+revocation_list.session_factory = TestingAsyncSessionLocal
+
+
 # Função que substitui a dependência do banco de dados original pela versão de teste
-def override_get_db():
-    db = TestingSessionLocal()  # Criamos uma nova sessão de banco de dados
-    try:
-        yield db  # Passamos a sessão para os testes
-    finally:
-        db.close()  # Fechamos a sessão após o teste
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:  # Criamos uma nova sessão de banco de dados
+        yield db  # Passamos a sessão para os testes (ela é fechada ao sair do bloco)
+
+
+# As rotas do admin que consultam todos os shards de todos usam um único shard: o banco de testes.
+def override_get_todo_shards():
+    return [ReplicaRouter(TestingAsyncSessionLocal)]
 
 
 # Função que substitui a autenticação real por um usuário fictício
@@ -48,6 +67,16 @@ def override_get_current_user():
 client = TestClient(app)
 
 
+# As fixtures gravam direto no banco, sem passar pelas rotas que invalidam o cache,
+# então cada teste começa com o cache de leitura vazio.
+@pytest.fixture(autouse=True)
+def clear_read_caches():
+    todo_cache.backend.clear()
+    user_cache.backend.clear()
+    login_rate_limiter.clear()
+    revocation_list.clear()
+
+
 @pytest.fixture
 def test_todo():
     todo = TodosModel(
@@ -92,4 +121,6 @@ def test_user():
     yield user
     with engine.connect() as connection:
         connection.execute(text("DELETE FROM users;"))
+        connection.execute(text("DELETE FROM refresh_tokens;"))
+        connection.execute(text("DELETE FROM revoked_tokens;"))
         connection.commit()
\ No newline at end of file